@@ -0,0 +1,114 @@
+import argparse
+from pathlib import Path
+import multiprocessing as mp
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from simulation.model import CommunicationNetwork, CompactCommunicationNetwork
+from simulation.minimal_paths import single_source_dijkstra_hyperedges, single_source_dijkstra_vertices, DistanceType
+from simulation.profiling import hyperedge_relaxations, source_relaxations
+from simulation.results import dumps
+
+from .generators import synthetic_network, write_network
+
+ENGINES = {'hyperedges': single_source_dijkstra_hyperedges, 'vertices': single_source_dijkstra_vertices}
+
+
+def benchmark_size(num_participants, num_sources, generator_options, seed):
+    """Benchmarks one network size; run in a fresh process, so that the peak RSS belongs to this size"""
+    result = {'participants': num_participants}
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = Path(directory)/'network.json.bz2'
+        write_network(synthetic_network(num_participants, seed=seed, **generator_options), file_path)
+        result['file_bytes'] = file_path.stat().st_size
+
+        start = time.perf_counter()
+        CommunicationNetwork.from_json(file_path, use_cache=False)
+        result['from_json_seconds'] = time.perf_counter() - start
+        start = time.perf_counter()
+        network = CompactCommunicationNetwork.from_json(file_path, use_cache=False)
+        result['compact_from_json_seconds'] = time.perf_counter() - start
+    result['channels'] = network.num_hyperedges()
+    result['incidences'] = int(network.arrays()[0][-1])
+
+    sources = np.random.default_rng(seed).choice(network.num_vertices(), min(num_sources, network.num_vertices()), replace=False).tolist()
+    result['sources'] = len(sources)
+    timings = {}
+    for engine_name, single_source_dijkstra in ENGINES.items():
+        for distance_type in DistanceType:
+            start = time.perf_counter()
+            for source in sources:
+                single_source_dijkstra(network, network.vertex_ids()[source], distance_type)
+            timings[f'{engine_name}_{distance_type.name.lower()}'] = time.perf_counter() - start
+    # counted after timing the engines, as it builds the successor index that the first hyperedges engine call builds otherwise
+    hedge_relaxations = hyperedge_relaxations(network)
+    total_relaxations = sum(source_relaxations(network, source, hedge_relaxations) for source in sources)
+    result['relaxations'] = total_relaxations
+    for name, seconds in timings.items():
+        result[name] = {'seconds': seconds, 'sources_per_second': len(sources) / seconds, 'relaxations_per_second': total_relaxations / seconds}
+    result['peak_rss_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return result
+
+
+def benchmark_pipeline(num_participants, generator_options, seed, simulation_args):
+    """Runs python -m simulation.run on a synthetic network in a temporary directory"""
+    with tempfile.TemporaryDirectory() as directory:
+        write_network(synthetic_network(num_participants, seed=seed, **generator_options), Path(directory)/'data'/'networks'/'microsoft.json.bz2')
+        environment = {**os.environ, 'PYTHONPATH': os.pathsep.join([str(Path(__file__).resolve().parents[1]), os.environ.get('PYTHONPATH', '')])}
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-m', 'simulation.run', '--select', 'microsoft', *simulation_args], cwd=directory, env=environment,
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        seconds = time.perf_counter() - start
+    return {'participants': num_participants, 'seconds': seconds, 'sources_per_second': num_participants / seconds,
+            'peak_rss_bytes': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024}
+
+
+def scaling_exponents(results, key):
+    """Log-log slope of the measured seconds over the number of participants per measurement"""
+    exponents = {}
+    for name in (name for name, value in results[0].items() if isinstance(value, dict) or name.endswith('seconds')):
+        seconds = [result[name]['seconds'] if isinstance(result[name], dict) else result[name] for result in results]
+        exponents[name] = float(np.polyfit(np.log([result[key] for result in results]), np.log(seconds), 1)[0]) if len(results) > 1 else None
+    return exponents
+
+
+def run_benchmarks():
+    parser = argparse.ArgumentParser(description='Benchmark the simulation on reproducible synthetic code review networks')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 300, 1000], help='Numbers of participants (default 100 300 1000)')
+    parser.add_argument('--sources', type=int, default=32, help='Number of sampled sources per size and engine (default 32)')
+    parser.add_argument('--channels_per_participant', type=float, default=3.0, help='Number of channels per participant (default 3)')
+    parser.add_argument('--mean_channel_size', type=float, default=3.0, help='Mean number of participants per channel, at least 2 (default 3)')
+    parser.add_argument('--degree_exponent', type=float, default=1.0, help='Zipf exponent of the participant degrees, 0 for uniform (default 1)')
+    parser.add_argument('--time_span_days', type=int, default=365, help='Time span of the channels in days (default 365)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (default 0)')
+    parser.add_argument('--pipeline', action='store_true', help='Also time the full python -m simulation.run pipeline per size')
+    parser.add_argument('--simulation_args', type=str, nargs=argparse.REMAINDER, default=[], help='Further arguments for python -m simulation.run')
+    parser.add_argument('--output', type=str, help='Write the JSON report to this file instead of stdout')
+    args = parser.parse_args()
+
+    generator_options = {'channels_per_participant': args.channels_per_participant, 'mean_channel_size': args.mean_channel_size,
+                         'degree_exponent': args.degree_exponent, 'time_span_days': args.time_span_days}
+    report = {'options': vars(args), 'sizes': [], 'pipeline': []}
+    with mp.get_context('spawn').Pool(1, maxtasksperchild=1) as pool:
+        for size in args.sizes:
+            report['sizes'] += [pool.apply(benchmark_size, (size, args.sources, generator_options, args.seed))]
+            print(dumps(report['sizes'][-1]).decode(), file=sys.stderr)
+            if args.pipeline:
+                report['pipeline'] += [pool.apply(benchmark_pipeline, (size, generator_options, args.seed, args.simulation_args))]
+    report['scaling_exponents'] = scaling_exponents(report['sizes'], 'participants')
+    if args.pipeline:
+        report['pipeline_scaling_exponents'] = scaling_exponents(report['pipeline'], 'participants')
+    if args.output:
+        Path(args.output).write_bytes(dumps(report))
+    else:
+        print(dumps(report).decode())
+
+
+if __name__ == '__main__':
+    run_benchmarks()
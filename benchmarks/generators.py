@@ -0,0 +1,44 @@
+from datetime import datetime, timedelta
+from pathlib import Path
+import bz2
+
+import numpy as np
+
+try:
+    import orjson as json
+except ImportError:
+    import json
+
+START = datetime(2020, 1, 1)
+
+
+def synthetic_network(num_participants, channels_per_participant=3.0, mean_channel_size=3.0, degree_exponent=1.0, time_span_days=365, seed=0):
+    """Reproducible synthetic code review network in the JSON structure of data/networks (channel ID -> channel).
+
+    Channels have 2 + Poisson(mean_channel_size - 2) participants (at most num_participants). Participants are drawn
+    with probability proportional to rank^-degree_exponent, so their degrees are heavy-tailed (Zipf-like) for exponents
+    around 1 and uniform for 0. Channel ends are uniform over time_span_days.
+    """
+    rng = np.random.default_rng(seed)
+    num_channels = round(num_participants * channels_per_participant)
+    weights = np.arange(1, num_participants + 1, dtype=float) ** -degree_exponent
+    weights /= weights.sum()
+    sizes = np.minimum(2 + rng.poisson(max(mean_channel_size - 2, 0), num_channels), num_participants)
+    ends = rng.integers(0, time_span_days * 24 * 3600, num_channels)
+    participants = rng.permutation(num_participants)  # do not correlate degree and ID
+
+    channels = {}
+    for chan_id, (size, end) in enumerate(zip(sizes.tolist(), ends.tolist())):
+        members: dict = {}
+        while len(members) < size:
+            members.update(dict.fromkeys(participants[rng.choice(num_participants, size - len(members), p=weights)].tolist()))
+        end = START + timedelta(seconds=end)
+        channels[str(chan_id)] = {'bound': 'right_bounded', 'start': (end - timedelta(hours=1)).isoformat(), 'end': end.isoformat(),
+                                  'participants': list(members)}
+    return channels
+
+
+def write_network(channels, file_path):
+    dumped = json.dumps(channels)
+    Path(file_path).parent.mkdir(parents=True, exist_ok=True)
+    Path(file_path).write_bytes(bz2.compress(dumped if isinstance(dumped, bytes) else dumped.encode()))
@@ -1,4 +1,10 @@
+import sys
+
 from .run import run_simulation
+from .distributed import run_worker
 
 if __name__ == '__main__':
-    run_simulation()
+    if sys.argv[1:2] == ['worker']:
+        run_worker()
+    else:
+        run_simulation()
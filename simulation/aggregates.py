@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+
+from .minimal_paths import DistanceType
+from .model import CompactTimeVaryingHypergraph
+
+QUANTILES = (0.1, 0.25, 0.5, 0.75, 0.9, 0.99)
+SUMMARY_COLUMNS = ['source', 'reachable', *(f'{distance_type.name.lower()}_{statistic}' for distance_type in DistanceType for statistic in ('mean', 'median', 'max'))]
+
+
+def histogram_edges(hypergraph: CompactTimeVaryingHypergraph, bins=1000):
+    """Bin edges per distance type in the network's time unit, shared by all workers so that their histograms can be added up.
+
+    Shortest distances are counted per number of hops, so they have no fixed edges (None). Fastest and foremost
+    distances get up to bins equally wide bins over the time span of the network.
+    """
+    timings = hypergraph.arrays()[4]
+    first, last = (int(timings[0]), int(timings[-1])) if len(timings) else (0, 0)
+    span = last - first + 1
+    widths = span * np.arange(min(bins, span) + 1, dtype=np.int64) // min(bins, span)
+    return {DistanceType.SHORTEST: None, DistanceType.FASTEST: widths, DistanceType.FOREMOST: first + widths}
+
+
+def aggregate(block, sources, codes, edges, per_source=False):
+    """Reduces a packed block of multi_source_dijkstra_all to a summary row per source and histograms per distance type.
+
+    codes are the vertex indices of sources, which may be missing from the block if they reach no one. With
+    per_source, the histograms have a row per source instead of being added up.
+    """
+    source_column, _, *distances = block
+    order = np.argsort(source_column, kind='stable')
+    sorted_sources = source_column[order]
+    starts = np.searchsorted(sorted_sources, codes, side='left')
+    stops = np.searchsorted(sorted_sources, codes, side='right')
+    summaries = []
+    for source, start, stop in zip(sources, starts.tolist(), stops.tolist()):
+        row = [source, stop - start]
+        for column in distances:
+            values = column[order[start:stop]]
+            row += [values.mean(), np.median(values), values.max()] if len(values) else [np.nan] * 3
+        summaries += [tuple(row)]
+    code_order = np.argsort(codes)
+    rows = code_order[np.searchsorted(codes[code_order], sorted_sources)]  # position in sources of each sorted row
+    counts = {}
+    for distance_type, column in zip(DistanceType, distances):
+        if edges[distance_type] is None:
+            bins, num_bins = column[order], int(column.max()) + 1 if len(column) else 0
+        else:
+            bins, num_bins = np.searchsorted(edges[distance_type], column[order], side='right') - 1, len(edges[distance_type]) - 1
+        if per_source:
+            counts[distance_type] = np.bincount(rows * num_bins + bins, minlength=len(sources) * num_bins).astype(np.int64).reshape(len(sources), num_bins)
+        else:
+            counts[distance_type] = np.bincount(bins, minlength=num_bins).astype(np.int64)
+    return summaries, counts
+
+
+def merge_counts(counts, other):
+    """Adds up the histograms of two aggregates; histograms per hop are padded to the longer one"""
+    merged = {}
+    for distance_type in DistanceType:
+        left, right = counts[distance_type], other[distance_type]
+        if len(left) < len(right):
+            left, right = right, left
+        merged[distance_type] = left.copy()
+        merged[distance_type][:len(right)] += right
+    return merged
+
+
+def histogram_quantiles(counts, edges, quantiles=QUANTILES):
+    """Quantiles of the distances in a histogram: the number of hops for per-hop histograms, linearly interpolated within fixed bins"""
+    total = counts.sum()
+    if total == 0:
+        return {str(quantile): None for quantile in quantiles}
+    cumulative = np.cumsum(counts)
+    result = {}
+    for quantile in quantiles:
+        position = quantile * total
+        bin_index = min(int(np.searchsorted(cumulative, position, side='left')), len(counts) - 1)
+        if edges is None:
+            result[str(quantile)] = bin_index
+        else:
+            before = cumulative[bin_index] - counts[bin_index]
+            width = edges[bin_index + 1] - edges[bin_index]
+            result[str(quantile)] = float(edges[bin_index] + (position - before) / max(counts[bin_index], 1) * width)
+    return result
+
+
+def summarize_distributions(summaries: pd.DataFrame, counts, edges, datetime_timings):
+    """Overall distributions per distance type (in the network's time unit, µs for datetimes) from the merged aggregates"""
+    pairs = int(summaries.reachable.sum())
+    result = {'sources': len(summaries), 'pairs': pairs, 'datetime_timings': datetime_timings, 'distance_types': {}}
+    for distance_type in DistanceType:
+        name = distance_type.name.lower()
+        type_edges = np.arange(len(counts[distance_type]) + 1) if edges[distance_type] is None else edges[distance_type]
+        result['distance_types'][name] = {
+            'mean': float((summaries[f'{name}_mean'] * summaries.reachable).sum() / pairs) if pairs else None,
+            'quantiles': histogram_quantiles(counts[distance_type], edges[distance_type]),
+            'edges': type_edges.tolist(),
+            'counts': counts[distance_type].tolist(),
+        }
+    return result
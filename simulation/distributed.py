@@ -0,0 +1,178 @@
+import argparse
+from multiprocessing.connection import Client, Listener
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+
+import numpy as np
+
+from .model import CompactCommunicationNetwork, SUCCESSOR_BUDGET
+from .minimal_paths import multi_source_dijkstra_all, SUCCESSOR_ENGINES
+from .aggregates import aggregate
+from .profiling import hyperedge_relaxations, profile_multi_source_all
+from .results import fingerprint
+
+
+def compute_shard(network, sources, single_source_dijkstra, relaxations=None, edges=None, per_source=False):
+    """Packed block (or its aggregates if edges are given, see aggregate) and stats (if relaxations are given) of sources"""
+    if relaxations is not None:
+        block, stats = profile_multi_source_all(network, sources, single_source_dijkstra, relaxations)
+    else:
+        block, stats = multi_source_dijkstra_all(network, sources, single_source_dijkstra), None
+    if edges is not None:
+        block = aggregate(block, sources, np.array([network.vertex_index(source) for source in sources], dtype=np.int32), edges, per_source)
+    return block, stats
+
+
+def parse_address(address: str):
+    host, _, port = address.rpartition(':')
+    return host or '0.0.0.0', int(port)
+
+
+class Coordinator:
+    """Hands out shards of sources to workers connecting via TCP (see serve) and collects their packed results.
+
+    Every connection is served by a thread that sends a worker one shard at a time and waits for its result, so
+    workers pull shards as fast as they complete them. A shard is queued again if its worker reports an error or its
+    connection is lost, up to max_retries times.
+    """
+
+    def __init__(self, address, authkey: bytes, max_retries=3):
+        self._listener = Listener(address, authkey=authkey)
+        self.address = self._listener.address
+        self.max_retries = max_retries
+        self._tasks: queue.Queue = queue.Queue()
+        self._results: queue.Queue = queue.Queue()
+        self._next_task_id = 0
+        self._closed = False
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        self._tasks.put(None)  # passed on by every connection thread, so that all workers stop
+        self._closed = True
+        self._listener.close()
+
+    def map(self, spec: dict, chunks):
+        """Queues the chunks as shards of the network described by spec and returns an iterator over (chunk, block, stats) as they complete"""
+        tasks = {}
+        for chunk in chunks:
+            tasks[self._next_task_id] = chunk
+            self._tasks.put((self._next_task_id, spec, chunk))
+            self._next_task_id += 1
+        return self._collect(tasks)
+
+    def _collect(self, tasks: dict):
+        failures = dict.fromkeys(tasks, 0)
+        while tasks:
+            (task_id, spec, chunk), block, stats, error = self._results.get()
+            if task_id not in tasks:
+                continue
+            if error is None:
+                del tasks[task_id]
+                yield chunk, block, stats
+                continue
+            failures[task_id] += 1
+            if failures[task_id] > self.max_retries:
+                raise RuntimeError(f'Shard of {len(chunk)} sources of {spec["name"]} failed {failures[task_id]} times:\n{error}')
+            self._tasks.put((task_id, spec, chunk))
+
+    def _accept(self):
+        while True:
+            try:
+                connection = self._listener.accept()
+            except Exception as error:  # e.g., a wrong authkey or a client that hung up during the handshake
+                if self._closed:
+                    return
+                print(f'Rejected connection to the coordinator: {error!r}', file=sys.stderr)
+                continue
+            threading.Thread(target=self._serve, args=(connection, ), daemon=True).start()
+
+    def _serve(self, connection):
+        task = None
+        try:
+            with connection:
+                while True:
+                    task = self._tasks.get()
+                    if task is None:
+                        self._tasks.put(None)
+                        connection.send(('done', ))
+                        return
+                    connection.send(('task', *task))
+                    reply = connection.recv()
+                    self._results.put((task, reply[1], reply[2], None) if reply[0] == 'result' else (task, None, None, reply[1]))
+                    task = None
+        except (EOFError, OSError):
+            if task is not None:
+                self._results.put((task, None, None, 'Connection to worker lost'))
+
+
+def serve(address, authkey: bytes, load_network, wait=60.0):
+    """Computes shards of a coordinator until it is done; load_network(spec) returns the network of a shard and is only called when the spec changes"""
+    deadline = time.monotonic() + wait
+    while True:
+        try:
+            connection = Client(address, authkey=authkey)
+            break
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(1.0)
+    loaded_key, network, relaxations = None, None, None
+    with connection:
+        while True:
+            message = connection.recv()
+            if message[0] == 'done':
+                return
+            _, _, spec, sources = message
+            key = {name: value for name, value in spec.items() if name != 'edges'}  # the arrays of edges cannot be compared with ==
+            try:
+                if key != loaded_key:
+                    loaded_key, network = None, None  # release the previous network before loading the next
+                    network = load_network(spec)
+                    relaxations = hyperedge_relaxations(network) if spec.get('profile') else None
+                    loaded_key = key
+                connection.send(('result', *compute_shard(network, sources, spec['single_source_dijkstra'], relaxations, spec.get('edges'), spec.get('per_source', False))))
+            except Exception:
+                connection.send(('error', traceback.format_exc()))
+
+
+def network_spec(communication_network: CompactCommunicationNetwork, min_timing, max_timing, single_source_dijkstra, profile, edges=None, per_source=False,
+                 successor_budget=SUCCESSOR_BUDGET):
+    return {'name': communication_network.name, 'min_timing': min_timing, 'max_timing': max_timing, 'single_source_dijkstra': single_source_dijkstra,
+            'profile': profile, 'fingerprint': fingerprint(communication_network, communication_network.num_hyperedges()), 'edges': edges, 'per_source': per_source,
+            'successor_budget': successor_budget}
+
+
+def load_network(spec: dict, threads=1):
+    """Loads the network of a spec from ./data/networks (cached after the first load) and checks that it equals the coordinator's"""
+    communication_network = CompactCommunicationNetwork.from_json(f'./data/networks/{spec["name"]}.json.bz2', name=spec['name'], threads=threads)
+    if spec['min_timing'] or spec['max_timing']:
+        communication_network = communication_network.window(spec['min_timing'], spec['max_timing'])
+    if fingerprint(communication_network, communication_network.num_hyperedges()) != spec['fingerprint']:
+        raise ValueError(f'Network {spec["name"]} differs from the network of the coordinator')
+    communication_network.successor_budget = spec.get('successor_budget', SUCCESSOR_BUDGET)
+    if spec['single_source_dijkstra'] in SUCCESSOR_ENGINES:
+        communication_network.successor_index(threads=threads)
+    return communication_network
+
+
+def run_worker():
+    parser = argparse.ArgumentParser(prog='python -m simulation worker', description='Compute shards of participants for a coordinator started by simulation.run --coordinator')
+    parser.add_argument('command', choices=['worker'])
+    parser.add_argument('--coordinator', type=str, required=True, help='HOST:PORT of the coordinator')
+    parser.add_argument('--authkey', type=str, default=os.environ.get('SIMULATION_AUTHKEY'), help='Shared secret of coordinator and workers (default $SIMULATION_AUTHKEY)')
+    parser.add_argument('--decompression_threads', type=int, default=1, help='Number of threads to decompress multi-stream .bz2/.zst network files (default 1)')
+    parser.add_argument('--wait', type=float, default=60.0, help='Seconds to wait for the coordinator to accept connections (default 60)')
+    args = parser.parse_args()
+    if not args.authkey:
+        parser.error('--authkey or $SIMULATION_AUTHKEY is required')
+    serve(parse_address(args.coordinator), args.authkey.encode(), lambda spec: load_network(spec, args.decompression_threads), args.wait)
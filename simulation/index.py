@@ -0,0 +1,145 @@
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from .model import EntityNotFound, EPOCH, AWARE_EPOCH, MICROSECOND, dump_timezone, load_timezone
+from .minimal_paths import DistanceType
+from .results import ResultStore, COLUMNS, dumps, write_meta
+
+try:
+    import orjson as json
+except ImportError:
+    import json
+
+DISTANCE_COLUMNS = {distance_type: distance_type.name.lower() for distance_type in DistanceType}
+
+
+class DistanceIndex:
+    """Read-only on-disk index of the minimal distances for lookups without loading all results.
+
+    The rows of the columnar store are sorted by source and target code; offsets.bin holds where the rows of each
+    source begin, so all queries of a source memory-map only its block, in which targets are binary searched.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        meta = json.loads((self.path/'meta.json').read_bytes())
+        self.datetime_timings = meta['datetime_timings']
+        self.timezone = load_timezone(meta.get('timezone'))
+        self.participants = tuple(json.loads((self.path/'participants.json').read_bytes()))
+        self._participant_index = {participant: index for index, participant in enumerate(self.participants)}
+        self._offsets = np.memmap(self.path/'offsets.bin', dtype=np.int64, mode='r')
+        rows = int(self._offsets[-1])
+        self._columns = {column: np.memmap(self.path/f'{column}.bin', dtype=dtype, mode='r', shape=(rows,)) if rows else np.empty(0, dtype=dtype)
+                         for column, dtype in COLUMNS.items() if column != 'source'}
+
+    @classmethod
+    def build(cls, store: ResultStore, path):
+        """Writes the index of a complete store to path, one source at a time"""
+        if len(store.completed()) != len(store.participants):
+            raise ValueError(f'Cannot index {store.path}: the results are incomplete, resume them first')
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        run_starts, run_stops = store.source_runs()
+        columns = {column: store.column(column) for column in COLUMNS if column != 'source'}
+        offsets = np.zeros(len(store.participants) + 1, dtype=np.int64)
+        files = {column: (path/f'{column}.bin').open('wb') for column in columns}
+        try:
+            for source in range(len(store.participants)):
+                start, stop = run_starts[source], run_stops[source]
+                order = np.argsort(columns['target'][start:stop], kind='stable')
+                for column, array in columns.items():
+                    files[column].write(np.asarray(array[start:stop])[order].tobytes())
+                offsets[source + 1] = offsets[source] + stop - start
+        finally:
+            for file in files.values():
+                file.close()
+        offsets.tofile(path/'offsets.bin')
+        (path/'participants.json').write_bytes(dumps(list(store.participants)))
+        write_meta(path, {'datetime_timings': store.datetime_timings(), 'timezone': dump_timezone(store.timezone())})
+        return cls(path)
+
+    def distance(self, source, target, distance_type: DistanceType):
+        """Distance from source to target or None if target is not reachable"""
+        start, stop = self._block(source)
+        code = self._code(target)
+        position = start + int(np.searchsorted(self._columns['target'][start:stop], code))
+        if position == stop or self._columns['target'][position] != code:
+            return None
+        return self._to_native(int(self._columns[DISTANCE_COLUMNS[distance_type]][position]), distance_type)
+
+    def reachable(self, source):
+        """Participants reachable from source in sorted order"""
+        start, stop = self._block(source)
+        return [self.participants[code] for code in self._columns['target'][start:stop].tolist()]
+
+    def distances(self, source, distance_type: DistanceType):
+        start, stop = self._block(source)
+        return {self.participants[code]: self._to_native(distance, distance_type)
+                for code, distance in zip(self._columns['target'][start:stop].tolist(), self._columns[DISTANCE_COLUMNS[distance_type]][start:stop].tolist())}
+
+    def histogram(self, source, distance_type: DistanceType, bins=10):
+        """np.histogram of the distances from source; for fastest and foremost distances in the network's time unit (µs for datetimes)"""
+        start, stop = self._block(source)
+        return np.histogram(self._columns[DISTANCE_COLUMNS[distance_type]][start:stop], bins=bins)
+
+    def _code(self, participant):
+        if participant in self._participant_index:
+            return self._participant_index[participant]
+        raise EntityNotFound(f'Unknown participant {participant}')
+
+    def _block(self, source):
+        code = self._code(source)
+        return int(self._offsets[code]), int(self._offsets[code + 1])
+
+    def _to_native(self, distance, distance_type: DistanceType):
+        if self.datetime_timings and distance_type == DistanceType.FASTEST:
+            return distance * MICROSECOND
+        if self.datetime_timings and distance_type == DistanceType.FOREMOST and self.timezone is not None:
+            return (AWARE_EPOCH + distance * MICROSECOND).astimezone(self.timezone)
+        if self.datetime_timings and distance_type == DistanceType.FOREMOST:
+            return EPOCH + distance * MICROSECOND
+        return distance
+
+
+def run_index():
+    parser = argparse.ArgumentParser(description='Build and query on-disk indices of the minimal distances')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help='Build indices in data/index from the columnar results in data/distances')
+    build_parser.add_argument('--select', type=str, nargs='+', help='Names of the networks to index (default all in data/distances)')
+    query_parser = subparsers.add_parser('query', help='Print the distances from a participant as CSV')
+    query_parser.add_argument('name', type=str, help='Name of the network')
+    query_parser.add_argument('source', type=str, help='Source participant')
+    query_parser.add_argument('--target', type=str, help='Only print the distance to this participant')
+    query_parser.add_argument('--metric', type=str, choices=DISTANCE_COLUMNS.values(), default='shortest', help='Distance type (default shortest)')
+    query_parser.add_argument('--histogram', type=int, metavar='BINS', help='Print a histogram with this number of bins instead of the distances')
+    args = parser.parse_args()
+
+    store_dir_path = Path('./data/distances/')
+    index_dir_path = Path('./data/index/')
+    if args.command == 'build':
+        for name in args.select or sorted(path.name for path in store_dir_path.iterdir() if path.is_dir()):
+            DistanceIndex.build(ResultStore(store_dir_path/name), index_dir_path/name)
+        return
+
+    index = DistanceIndex(index_dir_path/args.name)
+    by_name = {str(participant): participant for participant in index.participants}  # participants may be numeric IDs
+    distance_type = DistanceType[args.metric.upper()]
+    source = by_name.get(args.source, args.source)
+    if args.histogram:
+        counts, edges = index.histogram(source, distance_type, bins=args.histogram)
+        print('bin_start,bin_end,count')
+        edges = [index._to_native(int(edge), distance_type) for edge in edges]
+        for bin_start, bin_end, count in zip(edges[:-1], edges[1:], counts):
+            print(f'{bin_start},{bin_end},{count}')
+    elif args.target:
+        print(index.distance(source, by_name.get(args.target, args.target), distance_type))
+    else:
+        print(f'target,{args.metric}')
+        for target, distance in index.distances(source, distance_type).items():
+            print(f'{target},{distance}')
+
+
+if __name__ == '__main__':
+    run_index()
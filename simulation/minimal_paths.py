@@ -1,8 +1,17 @@
 import heapq
+from bisect import bisect_left
 from enum import Enum
 from datetime import datetime
 
-from .model import TimeVaryingHypergraph
+import numpy as np
+
+from .model import TimeVaryingHypergraph, CompactTimeVaryingHypergraph, ranges
+
+FRONTIER_BATCH_BYTES = 1 << 27
+# dense state of a frontier batch per (source, vertex) pair (shortest, foremost, scanned, claim) and per (source,
+# hyperedge) pair (visited)
+FRONTIER_VERTEX_DTYPES = (np.dtype(np.int32), np.dtype(np.int64), np.dtype(np.int64), np.dtype(np.int64))
+FRONTIER_HEDGE_DTYPES = (np.dtype(np.int32), )
 
 
 class DistanceType(Enum):
@@ -12,6 +21,10 @@ class DistanceType(Enum):
 
 
 def single_source_dijkstra_hyperedges(hypergraph: TimeVaryingHypergraph, source_vertex, distance_type: DistanceType, min_timing=datetime.min):
+    if isinstance(hypergraph, CompactTimeVaryingHypergraph):
+        source = hypergraph.vertex_index(source_vertex)
+        return export_distances(hypergraph, compact_dijkstra_hyperedges(hypergraph, source, distance_type), distance_type)
+
     hedge_distances: dict = {}
     queue: list = []
 
@@ -20,18 +33,18 @@ def single_source_dijkstra_hyperedges(hypergraph: TimeVaryingHypergraph, source_
             case DistanceType.SHORTEST:
                 init_value = 1
             case DistanceType.FASTEST:
-                init_value = min_timing - min_timing
+                init_value = 0
             case DistanceType.FOREMOST:
-                init_value = hypergraph.timings(source_hedge)
+                init_value = hypergraph.timing(source_hedge)
         heapq.heappush(queue, (init_value, source_hedge))
         hedge_distances[source_hedge] = init_value
 
     while queue:
         prior_distance, source_hedge = heapq.heappop(queue)
-        source_hedge_timing = hypergraph.timings(source_hedge)
+        source_hedge_timing = hypergraph.timing(source_hedge)
         for vertex in hypergraph.vertices(source_hedge):
             for next_hedge in hypergraph.hyperedges(vertex):
-                next_hedge_timing = hypergraph.timings(next_hedge)
+                next_hedge_timing = hypergraph.timing(next_hedge)
                 if source_hedge_timing < next_hedge_timing:
                     match distance_type:
                         case DistanceType.SHORTEST:
@@ -50,52 +63,628 @@ def single_source_dijkstra_hyperedges(hypergraph: TimeVaryingHypergraph, source_
             if vertex not in vertex_distances or distance < vertex_distances[vertex]:
                 vertex_distances[vertex] = distance
     vertex_distances.pop(source_vertex)
-    return vertex_distances
+    return _to_native(hypergraph, vertex_distances, distance_type)
 
 
-def single_source_dijkstra_vertices(hypergraph: TimeVaryingHypergraph, source_vertex, distance_type: DistanceType, min_timing=datetime.min):
-    distances: dict = {}
-    queue: list = []
+def single_source_dijkstra_vertices(hypergraph: TimeVaryingHypergraph, source_vertex, distance_type: DistanceType, min_timing=datetime.min, targets=None):
+    """Label-setting Dijkstra over (vertex, arrival) labels, pruning labels dominated at the same vertex.
 
-    source_hedge = None
-    source_reachable = (source_vertex, source_hedge)
+    A label is the timing of the hyperedge a vertex was reached by and the distance so far. It is dominated by a label
+    that arrived no later and has a better or equal distance (for FASTEST: started no earlier), see _dominates. With
+    targets, the search stops as soon as the distances to all targets are known and only returns those.
+    """
+    if isinstance(hypergraph, CompactTimeVaryingHypergraph):
+        source = hypergraph.vertex_index(source_vertex)
+        target_codes = None if targets is None else {hypergraph.vertex_index(target) for target in targets}
+        return export_distances(hypergraph, compact_dijkstra_vertices(hypergraph, source, distance_type, target_codes), distance_type)
 
-    match distance_type:
-        case DistanceType.SHORTEST:
-            init_distance = 0
-        case DistanceType.FASTEST:
-            init_distance = min_timing - min_timing
-        case DistanceType.FOREMOST:
-            init_distance = min_timing
+    labels: dict = {}
+    hedge_distances: dict = {}
+    minimal_distances: dict = {}
+    remaining = None if targets is None else set(targets) - {source_vertex}
+    counter = 0  # tie breaker, vertices need not be comparable
 
-    distances[source_reachable] = init_distance
-    heapq.heappush(queue, (init_distance, source_reachable))
+    queue: list = [(0, counter, source_vertex, None)]  # the distance of the source itself is dropped
 
     while queue:
-        distance, (vertex, source_hedge) = heapq.heappop(queue)
+        distance, _, vertex, arrival = heapq.heappop(queue)
+        if arrival is not None and (arrival, distance) not in labels[vertex]:
+            continue  # dominated after it was pushed
+        if vertex not in minimal_distances:
+            minimal_distances[vertex] = distance
+            if remaining is not None:
+                remaining.discard(vertex)
+                if not remaining:
+                    break
         for next_hedge in hypergraph.hyperedges(vertex):
-            if source_hedge:
-                source_hedge_timing = hypergraph.timings(source_hedge)
-            else:  # damn source_hedge
-                source_hedge_timing = hypergraph.timings(next_hedge)
-            next_hedge_timing = hypergraph.timings(next_hedge)
-            if not source_hedge or source_hedge_timing < next_hedge_timing:
-                for next_vertex in hypergraph.vertices(next_hedge):
-                    new_reachable = (next_vertex, next_hedge)
-                    match distance_type:
-                        case DistanceType.SHORTEST:
-                            new_distance = distance + 1
-                        case DistanceType.FASTEST:
-                            new_distance = distance + (next_hedge_timing - source_hedge_timing)
-                        case DistanceType.FOREMOST:
-                            new_distance = next_hedge_timing
-                    if new_reachable not in distances or new_distance < distances[new_reachable]:
-                        distances[new_reachable] = new_distance
-                        heapq.heappush(queue, (new_distance, new_reachable))
+            next_hedge_timing = hypergraph.timing(next_hedge)
+            if arrival is not None and not arrival < next_hedge_timing:
+                continue
+            match distance_type:
+                case DistanceType.SHORTEST:
+                    new_distance = distance + 1
+                case DistanceType.FASTEST:
+                    new_distance = distance if arrival is None else distance + (next_hedge_timing - arrival)
+                case DistanceType.FOREMOST:
+                    new_distance = next_hedge_timing
+            if next_hedge in hedge_distances and not new_distance < hedge_distances[next_hedge]:
+                continue  # all its vertices were already labelled no worse
+            hedge_distances[next_hedge] = new_distance
+            for next_vertex in hypergraph.vertices(next_hedge):
+                if _add_label(labels.setdefault(next_vertex, set()), (next_hedge_timing, new_distance), distance_type):
+                    counter += 1
+                    heapq.heappush(queue, (new_distance, counter, next_vertex, next_hedge_timing))
+
+    minimal_distances.pop(source_vertex, None)
+    if targets is not None:
+        minimal_distances = {target: minimal_distances[target] for target in targets if target in minimal_distances}
+    return _to_native(hypergraph, minimal_distances, distance_type)
+
+
+def _dominates(label, other, distance_type: DistanceType):
+    (arrival, distance), (other_arrival, other_distance) = label, other
+    if distance_type == DistanceType.FASTEST:  # continuing costs the next timing minus the start, arrival - distance
+        return arrival <= other_arrival and other_arrival - other_distance <= arrival - distance
+    return arrival <= other_arrival and distance <= other_distance
+
+
+def _add_label(vertex_labels: set, label, distance_type: DistanceType):
+    if any(_dominates(other, label, distance_type) for other in vertex_labels):
+        return False
+    vertex_labels.difference_update([other for other in vertex_labels if _dominates(label, other, distance_type)])
+    vertex_labels.add(label)
+    return True
+
+
+def compact_dijkstra_vertices(hypergraph: CompactTimeVaryingHypergraph, source: int, distance_type: DistanceType, targets=None):
+    hedge_offsets, hedge_vertices, vertex_offsets, vertex_hedges, timings = hypergraph.views()
+    later_hedges = memoryview(hypergraph.later_hyperedges())
+    labels: dict = {}
+    hedge_distances: dict = {}
     minimal_distances: dict = {}
-    for (vertex, _), distance in distances.items():
-        if vertex not in minimal_distances or distance < minimal_distances[vertex]:
+    remaining = None if targets is None else set(targets) - {source}
+
+    queue: list = [(0, source, -1)]  # (distance, vertex, hyperedge the vertex was reached by or -1 for the source)
+    while queue:
+        distance, vertex, hedge = heapq.heappop(queue)
+        if hedge >= 0:
+            arrival = timings[hedge]
+            if (arrival, distance) not in labels[vertex]:
+                continue
+            start = bisect_left(vertex_hedges, later_hedges[hedge], vertex_offsets[vertex], vertex_offsets[vertex + 1])
+        else:
+            start = vertex_offsets[vertex]
+        if vertex not in minimal_distances:
             minimal_distances[vertex] = distance
-    minimal_distances.pop(source_vertex)
+            if remaining is not None:
+                remaining.discard(vertex)
+                if not remaining:
+                    break
+        for next_hedge in vertex_hedges[start:vertex_offsets[vertex + 1]]:
+            next_hedge_timing = timings[next_hedge]
+            match distance_type:
+                case DistanceType.SHORTEST:
+                    new_distance = distance + 1
+                case DistanceType.FASTEST:
+                    new_distance = distance if hedge < 0 else distance + (next_hedge_timing - arrival)
+                case DistanceType.FOREMOST:
+                    new_distance = next_hedge_timing
+            if next_hedge in hedge_distances and not new_distance < hedge_distances[next_hedge]:
+                continue
+            hedge_distances[next_hedge] = new_distance
+            label = (next_hedge_timing, new_distance)
+            for next_vertex in hedge_vertices[hedge_offsets[next_hedge]:hedge_offsets[next_hedge + 1]]:
+                if _add_label(labels.setdefault(next_vertex, set()), label, distance_type):
+                    heapq.heappush(queue, (new_distance, next_vertex, next_hedge))
 
+    minimal_distances.pop(source, None)
+    if targets is not None:
+        return {target: minimal_distances[target] for target in targets if target in minimal_distances}
     return minimal_distances
+
+
+def compact_dijkstra_hyperedges(hypergraph: CompactTimeVaryingHypergraph, source: int, distance_type: DistanceType):
+    hedge_offsets, hedge_vertices, vertex_offsets, vertex_hedges, timings = hypergraph.views()
+    hedge_distances: dict = {}
+    queue: list = []
+
+    for source_hedge in vertex_hedges[vertex_offsets[source]:vertex_offsets[source + 1]]:
+        match distance_type:
+            case DistanceType.SHORTEST:
+                init_value = 1
+            case DistanceType.FASTEST:
+                init_value = 0
+            case DistanceType.FOREMOST:
+                init_value = timings[source_hedge]
+        heapq.heappush(queue, (init_value, source_hedge))
+        hedge_distances[source_hedge] = init_value
+
+    successors = hypergraph.successor_index().successors
+    while queue:
+        prior_distance, source_hedge = heapq.heappop(queue)
+        if prior_distance > hedge_distances[source_hedge]:
+            continue  # stale queue entry
+        source_hedge_timing = timings[source_hedge]
+        for next_hedge in successors(source_hedge):
+            match distance_type:
+                case DistanceType.SHORTEST:
+                    new_distance = prior_distance + 1
+                case DistanceType.FASTEST:
+                    new_distance = prior_distance + (timings[next_hedge] - source_hedge_timing)
+                case DistanceType.FOREMOST:
+                    new_distance = timings[next_hedge]
+            if next_hedge not in hedge_distances or new_distance < hedge_distances[next_hedge]:
+                hedge_distances[next_hedge] = new_distance
+                heapq.heappush(queue, (new_distance, next_hedge))
+
+    vertex_distances: dict = {}
+    for source_hedge, distance in hedge_distances.items():
+        for vertex in hedge_vertices[hedge_offsets[source_hedge]:hedge_offsets[source_hedge + 1]]:
+            if vertex not in vertex_distances or distance < vertex_distances[vertex]:
+                vertex_distances[vertex] = distance
+    vertex_distances.pop(source)
+    return vertex_distances
+
+
+def compact_dijkstra_hyperedges_all(hypergraph: CompactTimeVaryingHypergraph, source: int):
+    """Shortest, fastest and foremost distances from source in one pass.
+
+    All three metrics reach the same hyperedges, and the foremost distance of a reachable hyperedge is its own timing,
+    so only the shortest and fastest searches are run; both expand a hyperedge into its strictly later successors from
+    the hypergraph's SuccessorIndex.
+    """
+    source_hedges = hypergraph.incident_hyperedges(source).tolist()
+    distances = _dijkstra_hyperedges_all(hypergraph, dict.fromkeys(source_hedges, 1), dict.fromkeys(source_hedges, 0))
+    for vertex_distances in distances.values():
+        vertex_distances.pop(source)
+    return distances
+
+
+def _dijkstra_hyperedges_all(hypergraph: CompactTimeVaryingHypergraph, hedge_shortest: dict, hedge_fastest: dict):
+    # runs the shortest and fastest searches from the given initial hyperedge distances (both for the same hyperedges)
+    hedge_offsets, hedge_vertices, _, _, timings = hypergraph.views()
+    successors = hypergraph.successor_index().successors
+
+    queue = [(distance, hedge) for hedge, distance in hedge_shortest.items()]
+    heapq.heapify(queue)
+    while queue:
+        prior_distance, source_hedge = heapq.heappop(queue)
+        if prior_distance > hedge_shortest[source_hedge]:
+            continue
+        new_distance = prior_distance + 1
+        for next_hedge in successors(source_hedge):
+            if next_hedge not in hedge_shortest or new_distance < hedge_shortest[next_hedge]:
+                hedge_shortest[next_hedge] = new_distance
+                heapq.heappush(queue, (new_distance, next_hedge))
+
+    queue = [(distance, hedge) for hedge, distance in hedge_fastest.items()]
+    heapq.heapify(queue)
+    while queue:
+        prior_distance, source_hedge = heapq.heappop(queue)
+        if prior_distance > hedge_fastest[source_hedge]:
+            continue
+        source_hedge_timing = timings[source_hedge]
+        for next_hedge in successors(source_hedge):
+            new_distance = prior_distance + (timings[next_hedge] - source_hedge_timing)
+            if next_hedge not in hedge_fastest or new_distance < hedge_fastest[next_hedge]:
+                hedge_fastest[next_hedge] = new_distance
+                heapq.heappush(queue, (new_distance, next_hedge))
+
+    shortest: dict = {}
+    fastest: dict = {}
+    foremost: dict = {}
+    for hedge, hops in hedge_shortest.items():
+        duration = hedge_fastest[hedge]
+        timing = timings[hedge]
+        for vertex in hedge_vertices[hedge_offsets[hedge]:hedge_offsets[hedge + 1]]:
+            if vertex not in shortest:
+                shortest[vertex] = hops
+                fastest[vertex] = duration
+                foremost[vertex] = timing
+                continue
+            if hops < shortest[vertex]:
+                shortest[vertex] = hops
+            if duration < fastest[vertex]:
+                fastest[vertex] = duration
+            if timing < foremost[vertex]:
+                foremost[vertex] = timing
+    return {DistanceType.SHORTEST: shortest, DistanceType.FASTEST: fastest, DistanceType.FOREMOST: foremost}
+
+
+def latest_departures(hypergraph: CompactTimeVaryingHypergraph, first_new: int):
+    """When each vertex can last depart to reach the vertices of the hyperedges from first_new on via earlier ones.
+
+    Returns these vertices and per vertex a list of (timing, bits): as in temporal_reachability, the hyperedges before
+    first_new are walked in reverse chronological order with bitsets over these vertices, so a bit is gained at the
+    latest timing a time-respecting path to the corresponding vertex can depart. A source without bits cannot reach
+    the new hyperedges, unless it is one of their vertices.
+    """
+    hedge_offsets, hedge_vertices, _, _, timings = hypergraph.views()
+    members = np.unique(hypergraph.arrays()[1][hedge_offsets[first_new]:])
+    member_bits = dict(zip(members.tolist(), (1 << bit for bit in range(len(members)))))
+    reachable = [0] * hypergraph.num_vertices()
+    records: list = [[] for _ in range(hypergraph.num_vertices())]
+
+    def record(pending, timing):
+        for hedge_members, hedge_reachable in pending:
+            for vertex in hedge_members:
+                gained = hedge_reachable & ~reachable[vertex]
+                if gained:
+                    reachable[vertex] |= gained
+                    records[vertex] += [(timing, gained)]
+
+    pending: list = []
+    pending_timing = None
+    for hedge in reversed(range(first_new)):
+        if timings[hedge] != pending_timing:
+            record(pending, pending_timing)
+            pending = []
+            pending_timing = timings[hedge]
+        hedge_members = hedge_vertices[hedge_offsets[hedge]:hedge_offsets[hedge + 1]]
+        hedge_reachable = 0
+        for vertex in hedge_members:
+            hedge_reachable |= reachable[vertex] | member_bits.get(vertex, 0)
+        pending += [(hedge_members, hedge_reachable)]
+    record(pending, pending_timing)
+    return members, records
+
+
+def compact_extend_all(hypergraph: CompactTimeVaryingHypergraph, source: int, first_new: int, targets, shortest, fastest, foremost, departures):
+    """Updates the distances from source computed on the hyperedges before first_new with the later hyperedges.
+
+    targets and the three distance arrays are the packed results before the update, departures are the records of
+    source from latest_departures. Since the new hyperedges are later than all others, they can only extend paths at
+    their end: a new hyperedge is entered from source or from a vertex reached before, with one hop more than its
+    shortest distance and the duration since the latest departure to it. Returns the updated packed arrays, which
+    are the given ones if source cannot reach the new hyperedges.
+    """
+    members, records = departures
+    member_departures: dict = {}
+    for timing, bits in records:
+        while bits:
+            bit = bits & -bits
+            member_departures[int(members[bit.bit_length() - 1])] = timing
+            bits ^= bit
+    member_departures.pop(source, None)
+    if not member_departures and not np.isin(source, members):
+        return targets, shortest, fastest, foremost
+
+    reached_members = np.isin(targets, members)
+    seed_shortest = dict(zip(targets[reached_members].tolist(), shortest[reached_members].tolist()))
+    seed_shortest[source] = 0
+    member_departures[source] = None
+    _, _, vertex_offsets, vertex_hedges, timings = hypergraph.views()
+    hedge_shortest: dict = {}
+    hedge_fastest: dict = {}
+    for vertex, departure in member_departures.items():
+        stop = vertex_offsets[vertex + 1]
+        for hedge in vertex_hedges[bisect_left(vertex_hedges, first_new, vertex_offsets[vertex], stop):stop]:
+            hops = seed_shortest[vertex] + 1
+            duration = 0 if departure is None else timings[hedge] - departure
+            if hedge not in hedge_shortest or hops < hedge_shortest[hedge]:
+                hedge_shortest[hedge] = hops
+            if hedge not in hedge_fastest or duration < hedge_fastest[hedge]:
+                hedge_fastest[hedge] = duration
+    extended = _dijkstra_hyperedges_all(hypergraph, hedge_shortest, hedge_fastest)
+    for vertex_distances in extended.values():
+        vertex_distances.pop(source, None)
+
+    # merge: the minimum per target over the previous and the extended distances
+    all_targets = np.concatenate([targets, np.fromiter(extended[DistanceType.SHORTEST], dtype=np.int32)])
+    unique_targets, inverse = np.unique(all_targets, return_inverse=True)
+    updated = []
+    for distance_type, distances in zip(DistanceType, (shortest, fastest, foremost)):
+        column = np.full(len(unique_targets), np.iinfo(np.int64).max, dtype=np.int64)
+        np.minimum.at(column, inverse, np.concatenate([distances, np.fromiter(extended[distance_type].values(), dtype=np.int64)]))
+        updated += [column]
+    return unique_targets.astype(np.int32), *updated
+
+
+def single_source_sweep(hypergraph: CompactTimeVaryingHypergraph, source_vertex, distance_type: DistanceType, min_timing=datetime.min):
+    """Time-respecting BFS for SHORTEST and a chronological sweep for FOREMOST; FASTEST falls back to Dijkstra"""
+    source = hypergraph.vertex_index(source_vertex)
+    return export_distances(hypergraph, compact_sweep(hypergraph, source, distance_type), distance_type)
+
+
+def compact_sweep(hypergraph: CompactTimeVaryingHypergraph, source: int, distance_type: DistanceType):
+    match distance_type:
+        case DistanceType.SHORTEST:
+            return compact_bfs_shortest(hypergraph, source)
+        case DistanceType.FASTEST:
+            return compact_dijkstra_hyperedges(hypergraph, source, distance_type)
+        case DistanceType.FOREMOST:
+            return compact_sweep_foremost(hypergraph, source)
+
+
+def bfs_hedge_hops(hypergraph: CompactTimeVaryingHypergraph, source: int):
+    hedge_offsets, hedge_vertices, vertex_offsets, vertex_hedges, _ = hypergraph.views()
+    later_hedges = memoryview(hypergraph.later_hyperedges())
+    hedge_hops = dict.fromkeys(vertex_hedges[vertex_offsets[source]:vertex_offsets[source + 1]], 1)
+    # the hyperedges of a vertex are chronological, so the strictly later ones are a suffix; scanned[vertex] is where
+    # the already scanned part of that suffix begins, which bounds the total scan to the size of the incidence
+    scanned: dict = {}
+    frontier = list(hedge_hops)
+    hops = 1
+    while frontier:
+        hops += 1
+        next_frontier = []
+        for hedge in frontier:
+            first_later = later_hedges[hedge]
+            for vertex in hedge_vertices[hedge_offsets[hedge]:hedge_offsets[hedge + 1]]:
+                stop = scanned.get(vertex, vertex_offsets[vertex + 1])
+                start = bisect_left(vertex_hedges, first_later, vertex_offsets[vertex], stop)
+                if start < stop:
+                    scanned[vertex] = start
+                    for next_hedge in vertex_hedges[start:stop]:
+                        if next_hedge not in hedge_hops:
+                            hedge_hops[next_hedge] = hops
+                            next_frontier += [next_hedge]
+        frontier = next_frontier
+    return hedge_hops
+
+
+def compact_bfs_shortest(hypergraph: CompactTimeVaryingHypergraph, source: int):
+    hedge_offsets, hedge_vertices, _, _, _ = hypergraph.views()
+    vertex_distances: dict = {}
+    for hedge, hops in bfs_hedge_hops(hypergraph, source).items():  # in BFS order, so the first hit is minimal
+        for vertex in hedge_vertices[hedge_offsets[hedge]:hedge_offsets[hedge + 1]]:
+            vertex_distances.setdefault(vertex, hops)
+    vertex_distances.pop(source)
+    return vertex_distances
+
+
+def compact_sweep_foremost(hypergraph: CompactTimeVaryingHypergraph, source: int):
+    hedge_offsets, hedge_vertices, vertex_offsets, vertex_hedges, timings = hypergraph.views()
+    later_hedges = memoryview(hypergraph.later_hyperedges())
+    active = bytearray(hypergraph.num_hyperedges())
+    for source_hedge in vertex_hedges[vertex_offsets[source]:vertex_offsets[source + 1]]:
+        active[source_hedge] = 1
+
+    vertex_distances: dict = {}
+    hedge = active.find(1)
+    while hedge != -1:
+        timing = timings[hedge]
+        for vertex in hedge_vertices[hedge_offsets[hedge]:hedge_offsets[hedge + 1]]:
+            if vertex not in vertex_distances:  # first and therefore foremost arrival
+                vertex_distances[vertex] = timing
+                stop = vertex_offsets[vertex + 1]
+                for next_hedge in vertex_hedges[bisect_left(vertex_hedges, later_hedges[hedge], vertex_offsets[vertex], stop):stop]:
+                    active[next_hedge] = 1
+        hedge = active.find(1, hedge + 1)
+    vertex_distances.pop(source)
+    return vertex_distances
+
+
+def compact_sweep_all(hypergraph: CompactTimeVaryingHypergraph, source: int):
+    hedge_offsets, hedge_vertices, _, _, timings = hypergraph.views()
+    shortest: dict = {}
+    foremost: dict = {}
+    for hedge, hops in bfs_hedge_hops(hypergraph, source).items():
+        timing = timings[hedge]
+        for vertex in hedge_vertices[hedge_offsets[hedge]:hedge_offsets[hedge + 1]]:
+            if vertex not in shortest:
+                shortest[vertex] = hops
+                foremost[vertex] = timing
+            elif timing < foremost[vertex]:
+                foremost[vertex] = timing
+    shortest.pop(source)
+    foremost.pop(source)
+    fastest = compact_dijkstra_hyperedges(hypergraph, source, DistanceType.FASTEST)
+    return {DistanceType.SHORTEST: shortest, DistanceType.FASTEST: fastest, DistanceType.FOREMOST: foremost}
+
+
+def single_source_frontier(hypergraph: CompactTimeVaryingHypergraph, source_vertex, distance_type: DistanceType, min_timing=datetime.min):
+    """Time-respecting BFS vectorized over a batch of sources for SHORTEST and FOREMOST; FASTEST falls back to Dijkstra"""
+    source = hypergraph.vertex_index(source_vertex)
+    return export_distances(hypergraph, compact_frontier(hypergraph, source, distance_type), distance_type)
+
+
+def compact_frontier(hypergraph: CompactTimeVaryingHypergraph, source: int, distance_type: DistanceType):
+    if distance_type == DistanceType.FASTEST:
+        return compact_dijkstra_hyperedges(hypergraph, source, distance_type)
+    _, targets, shortest, foremost = frontier_shortest_foremost(hypergraph, [source])
+    return dict(zip(targets.tolist(), (shortest if distance_type == DistanceType.SHORTEST else foremost).tolist()))
+
+
+def frontier_shortest_foremost(hypergraph: CompactTimeVaryingHypergraph, sources):
+    """Shortest and foremost distances from a batch of sources, packed as in multi_source_dijkstra_all.
+
+    Runs the time-respecting BFS of bfs_hedge_hops for all sources at once: the frontier is the array of (source,
+    hyperedge) pairs reached with the same number of hops. Advancing it expands the pairs into (source, vertex) pairs,
+    keeps the earliest hyperedge per pair and takes the strictly later suffix of the vertex's chronological hyperedges,
+    which is a range, so each step is a few whole-array operations. Sources are processed in batches whose dense
+    (source, vertex) and (source, hyperedge) state fits into FRONTIER_BATCH_BYTES.
+    """
+    num_vertices, num_hedges = hypergraph.num_vertices(), hypergraph.num_hyperedges()
+    later_starts = hypergraph.later_incidences()
+    source_bytes = sum(dtype.itemsize for dtype in FRONTIER_VERTEX_DTYPES) * num_vertices + sum(dtype.itemsize for dtype in FRONTIER_HEDGE_DTYPES) * num_hedges
+    batch_size = max(1, FRONTIER_BATCH_BYTES // max(1, source_bytes))
+    blocks = [_frontier_batch(hypergraph, np.asarray(sources[start:start + batch_size], dtype=np.int64), later_starts) for start in range(0, len(sources), batch_size)]
+    return tuple(np.concatenate([block[column] for block in blocks] or [np.empty(0)], dtype=dtype)
+                 for column, dtype in enumerate((np.int32, np.int32, np.int64, np.int64)))
+
+
+def _frontier_batch(hypergraph: CompactTimeVaryingHypergraph, sources, later_starts):
+    hedge_offsets, hedge_vertices, vertex_offsets, vertex_hedges, timings = hypergraph.arrays()
+    num_vertices, num_hedges = hypergraph.num_vertices(), hypergraph.num_hyperedges()
+
+    # dense per-source state, flattened: (source, vertex) pairs index source * num_vertices + vertex, (source,
+    # hyperedge) pairs source * num_hedges + hyperedge
+    shortest_dtype, foremost_dtype, scanned_dtype, claim_dtype = FRONTIER_VERTEX_DTYPES
+    visited_dtype, = FRONTIER_HEDGE_DTYPES
+    shortest = np.zeros(len(sources) * num_vertices, dtype=shortest_dtype)  # 0: not reached
+    foremost = np.full(len(sources) * num_vertices, np.iinfo(foremost_dtype).max, dtype=foremost_dtype)
+    scanned = np.tile(vertex_offsets[1:].astype(scanned_dtype, copy=False), len(sources))  # as in bfs_hedge_hops, per source
+    claim = np.empty(len(sources) * num_vertices, dtype=claim_dtype)
+    visited = np.full(len(sources) * num_hedges, -1, dtype=visited_dtype)  # at which position of a frontier first
+
+    rows = np.repeat(np.arange(len(sources)), vertex_offsets[sources + 1] - vertex_offsets[sources])
+    hedges = vertex_hedges[ranges(vertex_offsets[sources], vertex_offsets[sources + 1])]
+    visited[rows * num_hedges + hedges] = 0
+    hops = 1
+    while len(rows):
+        sizes = hedge_offsets[hedges + 1] - hedge_offsets[hedges]
+        incidences = ranges(hedge_offsets[hedges], hedge_offsets[hedges + 1])
+        member_rows = np.repeat(rows, sizes)
+        pairs = member_rows * num_vertices + hedge_vertices[incidences]
+        shortest[pairs[shortest[pairs] == 0]] = hops
+        np.minimum.at(foremost, pairs, np.repeat(timings[hedges], sizes))
+
+        # per (source, vertex), the not yet scanned part of the strictly later hyperedges of the vertex after its
+        # earliest frontier hyperedge
+        starts = later_starts[incidences]
+        stops = scanned[pairs]
+        np.minimum.at(scanned, pairs, starts)
+        firsts = np.flatnonzero((scanned[pairs] == starts) & (starts < stops))
+        claim[pairs[firsts]] = firsts  # one per pair, the last write wins
+        firsts = firsts[claim[pairs[firsts]] == firsts]
+        member_rows, starts, stops = member_rows[firsts], starts[firsts], stops[firsts]
+
+        candidates = np.repeat(member_rows * num_hedges, stops - starts) + vertex_hedges[ranges(starts, stops)]
+        candidates = candidates[visited[candidates] < 0]
+        visited[candidates] = np.arange(len(candidates), dtype=visited_dtype)  # the last write per pair wins
+        candidates = candidates[visited[candidates] == np.arange(len(candidates), dtype=visited_dtype)]
+        rows, hedges = candidates // num_hedges, candidates % num_hedges
+        hops += 1
+
+    shortest[np.arange(len(sources)) * num_vertices + sources] = 0
+    pairs = np.flatnonzero(shortest)
+    return sources[pairs // num_vertices], pairs % num_vertices, shortest[pairs], foremost[pairs]
+
+
+def compact_frontier_all(hypergraph: CompactTimeVaryingHypergraph, sources):
+    source_codes, target_codes, shortest, foremost = frontier_shortest_foremost(hypergraph, sources)
+    fastest = []
+    for source in sources:
+        source_fastest = compact_dijkstra_hyperedges(hypergraph, source, DistanceType.FASTEST)
+        fastest += map(source_fastest.__getitem__, target_codes[source_codes == source].tolist())
+    return source_codes, target_codes, shortest, np.array(fastest, dtype=np.int64), foremost
+
+
+def export_distances(hypergraph: CompactTimeVaryingHypergraph, distances: dict, distance_type: DistanceType):
+    vertex_ids = hypergraph.vertex_ids()
+    match distance_type:
+        case DistanceType.SHORTEST:
+            return {vertex_ids[vertex]: distance for vertex, distance in distances.items()}
+        case DistanceType.FASTEST:
+            return {vertex_ids[vertex]: hypergraph.to_duration(distance) for vertex, distance in distances.items()}
+        case DistanceType.FOREMOST:
+            return {vertex_ids[vertex]: hypergraph.to_timing(distance) for vertex, distance in distances.items()}
+
+
+def _to_native(hypergraph: TimeVaryingHypergraph, distances: dict, distance_type: DistanceType):
+    # the dict backend computes on int timings as well (see TimingUnit) and only converts its results
+    match distance_type:
+        case DistanceType.SHORTEST:
+            return distances
+        case DistanceType.FASTEST:
+            return {vertex: hypergraph.to_duration(distance) for vertex, distance in distances.items()}
+        case DistanceType.FOREMOST:
+            return {vertex: hypergraph.to_timing(distance) for vertex, distance in distances.items()}
+
+
+COMPACT_ENGINES = {
+    single_source_dijkstra_hyperedges: compact_dijkstra_hyperedges,
+    single_source_dijkstra_vertices: compact_dijkstra_vertices,
+    single_source_sweep: compact_sweep,
+    single_source_frontier: compact_frontier,
+}
+COMPACT_ALL_ENGINES = {
+    single_source_dijkstra_hyperedges: compact_dijkstra_hyperedges_all,
+    single_source_dijkstra_vertices: lambda hypergraph, source: {distance_type: compact_dijkstra_vertices(hypergraph, source, distance_type) for distance_type in DistanceType},
+    single_source_sweep: compact_sweep_all,
+}
+BATCH_ALL_ENGINES = {
+    single_source_frontier: compact_frontier_all,
+}
+# engines that search hyperedges via the SuccessorIndex, at least for fastest distances
+SUCCESSOR_ENGINES = (single_source_dijkstra_hyperedges, single_source_sweep, single_source_frontier)
+
+
+def multi_source_dijkstra(hypergraph: CompactTimeVaryingHypergraph, sources, distance_type: DistanceType, single_source_dijkstra=single_source_dijkstra_hyperedges):
+    """Runs single_source_dijkstra for a batch of sources and packs the results into parallel source/target/distance arrays.
+
+    Sources and targets are vertex indices of the compact hypergraph, distances are int64 in its native time units.
+    """
+    source_codes, target_codes, distances = [], [], []
+    for source_vertex in sources:
+        source = hypergraph.vertex_index(source_vertex)
+        if single_source_dijkstra in COMPACT_ENGINES:
+            vertex_distances = COMPACT_ENGINES[single_source_dijkstra](hypergraph, source, distance_type)
+        else:
+            vertex_distances = import_distances(hypergraph, single_source_dijkstra(hypergraph, source_vertex, distance_type), distance_type)
+        source_codes += [source] * len(vertex_distances)
+        target_codes += vertex_distances.keys()
+        distances += vertex_distances.values()
+    return np.array(source_codes, dtype=np.int32), np.array(target_codes, dtype=np.int32), np.array(distances, dtype=np.int64)
+
+
+def import_distances(hypergraph: CompactTimeVaryingHypergraph, distances: dict, distance_type: DistanceType):
+    match distance_type:
+        case DistanceType.SHORTEST:
+            return {hypergraph.vertex_index(vertex): distance for vertex, distance in distances.items()}
+        case DistanceType.FASTEST:
+            return {hypergraph.vertex_index(vertex): hypergraph.from_duration(distance) for vertex, distance in distances.items()}
+        case DistanceType.FOREMOST:
+            return {hypergraph.vertex_index(vertex): hypergraph.from_timing(distance) for vertex, distance in distances.items()}
+
+
+def multi_source_dijkstra_all(hypergraph: CompactTimeVaryingHypergraph, sources, single_source_dijkstra=single_source_dijkstra_hyperedges):
+    """Like multi_source_dijkstra, but packs the shortest, fastest and foremost distances as three parallel columns"""
+    if single_source_dijkstra in BATCH_ALL_ENGINES:
+        return BATCH_ALL_ENGINES[single_source_dijkstra](hypergraph, [hypergraph.vertex_index(source_vertex) for source_vertex in sources])
+    source_codes, target_codes = [], []
+    columns: dict = {distance_type: [] for distance_type in DistanceType}
+    for source_vertex in sources:
+        source = hypergraph.vertex_index(source_vertex)
+        if single_source_dijkstra in COMPACT_ALL_ENGINES:
+            vertex_distances = COMPACT_ALL_ENGINES[single_source_dijkstra](hypergraph, source)
+        else:
+            vertex_distances = {distance_type: import_distances(hypergraph, single_source_dijkstra(hypergraph, source_vertex, distance_type), distance_type) for distance_type in DistanceType}
+        targets = vertex_distances[DistanceType.SHORTEST].keys()
+        source_codes += [source] * len(targets)
+        target_codes += targets
+        for distance_type, column in columns.items():
+            column += map(vertex_distances[distance_type].__getitem__, targets)
+    return (np.array(source_codes, dtype=np.int32), np.array(target_codes, dtype=np.int32),
+            *(np.array(column, dtype=np.int64) for column in columns.values()))
+
+
+def equivalent_sources(hypergraph: CompactTimeVaryingHypergraph, sources):
+    """Representatives of the sources with the same incident hyperedges and, per representative, its other sources.
+
+    All paths of such sources start in the same hyperedges, so they have the same distances to all other vertices and
+    the same distance to each other; the distances of a representative give those of its equivalent sources.
+    """
+    _, _, vertex_offsets, vertex_hedges, _ = hypergraph.arrays()
+    representatives, equivalents = {}, {}
+    for source_vertex in sources:
+        source = hypergraph.vertex_index(source_vertex)
+        signature = vertex_hedges[vertex_offsets[source]:vertex_offsets[source + 1]].tobytes()
+        if signature in representatives:
+            equivalents[representatives[signature]] += [source_vertex]
+        else:
+            representatives[signature] = source_vertex
+            equivalents[source_vertex] = []
+    return list(representatives.values()), {representative: others for representative, others in equivalents.items() if others}
+
+
+def expand_equivalent(hypergraph: CompactTimeVaryingHypergraph, block, sources, equivalents: dict):
+    """Adds the rows of the equivalent sources (see equivalent_sources) of the sources to their packed block and returns it with all sources.
+
+    The rows of an equivalent source are those of its representative, with the representative as target instead of it.
+    """
+    pairs = [(hypergraph.vertex_index(source_vertex), hypergraph.vertex_index(other)) for source_vertex in sources for other in equivalents.get(source_vertex, ())]
+    if not pairs:
+        return block, sources
+    representatives, others = np.array(pairs, dtype=np.int32).T
+    source_column, target_column, *distances = block
+    order = np.argsort(source_column, kind='stable')
+    starts = np.searchsorted(source_column[order], representatives, side='left')
+    stops = np.searchsorted(source_column[order], representatives, side='right')
+    rows = order[ranges(starts, stops)]
+    other_sources = np.repeat(others, stops - starts)
+    other_targets = np.where(target_column[rows] == other_sources, np.repeat(representatives, stops - starts), target_column[rows])
+    expanded = (np.concatenate([source_column, other_sources]), np.concatenate([target_column, other_targets]),
+                *(np.concatenate([column, column[rows]]) for column in distances))
+    return expanded, [*sources, *(other for source_vertex in sources for other in equivalents.get(source_vertex, ()))]
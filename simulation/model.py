@@ -1,19 +1,88 @@
-from datetime import datetime
-from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from array import array
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from copy import copy
+from json import JSONDecoder, JSONDecodeError
 from pathlib import Path
+from zoneinfo import ZoneInfo
 import bz2
+import codecs
+import hashlib
+import io
+import mmap
+import os
+import re
+import warnings
+
+import numpy as np
 
 try:
     import orjson as json
 except ImportError:
     import json
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+EPOCH = datetime(1970, 1, 1)
+AWARE_EPOCH = EPOCH.replace(tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+READ_SIZE = 1 << 20
+BZ2_STREAM = re.compile(rb'BZh[1-9](?:\x31\x41\x59\x26\x53\x59|\x17\x72\x45\x38\x50\x90)')  # stream header + block or end magic
+ZSTD_FRAME = re.compile(rb'\x28\xb5\x2f\xfd')
+WHITESPACE = re.compile(r'\s*')
+
+CACHE_MAGIC = b'TVHCACHE'
+CACHE_VERSION = 2
+ALIGNMENT = 64
+SUCCESSOR_BUDGET = 1 << 30
+SUCCESSOR_BATCH = 1 << 22
+LRU_ENTRY_BYTES = 256  # memoryview, array and dictionary entry
+
 
 class EntityNotFound(Exception):
     pass
 
 
-class TimeVaryingHypergraph:
+class TimingUnit:
+    """Conversion between the timings (datetimes or numbers) of a hypergraph and the ints the engines compute with.
+
+    Datetime timings are represented as int microseconds since EPOCH (in UTC for timezone-aware datetimes, which are
+    converted back to timezone), and durations between them as int microseconds.
+    """
+    datetime_timings = False
+    timezone = None
+
+    def to_timing(self, value):
+        if self.datetime_timings and self.timezone is not None:
+            return (AWARE_EPOCH + value * MICROSECOND).astimezone(self.timezone)
+        if self.datetime_timings:
+            return EPOCH + value * MICROSECOND
+        return value
+
+    def to_duration(self, value):
+        if self.datetime_timings:
+            return value * MICROSECOND
+        return value
+
+    def from_timing(self, timing):
+        if self.datetime_timings:
+            return microseconds(timing)
+        return timing
+
+    def from_duration(self, duration):
+        if self.datetime_timings:
+            return duration // MICROSECOND
+        return duration
+
+
+class TimeVaryingHypergraph(TimingUnit):
     def __init__(self, hedges: dict, timings: dict):
         self._vertices = defaultdict(list)
         for hedge, _vertices in hedges.items():
@@ -22,6 +91,13 @@ class TimeVaryingHypergraph:
 
         self._hedges = hedges
         self._timings = timings
+        self.datetime_timings = any(isinstance(timing, datetime) for timing in timings.values())
+        self.timezone = next((timing.tzinfo for timing in timings.values() if isinstance(timing, datetime) and timing.tzinfo is not None), None)
+        self._int_timings = {hedge: self.from_timing(timing) for hedge, timing in timings.items()} if self.datetime_timings else timings
+
+    def timing(self, hedge):
+        """Timing of a hyperedge as int (see TimingUnit)"""
+        return self._int_timings[hedge]
 
     def timings(self, entity=None):
         if entity is None:
@@ -42,6 +118,264 @@ class TimeVaryingHypergraph:
             return set(self._vertices[vertex])
         raise EntityNotFound(f'Unknown vertex {vertex}')
 
+    def compact(self):
+        return CompactTimeVaryingHypergraph.from_hedges(self._hedges, self._timings)
+
+    def window(self, min_timing=None, max_timing=None):
+        """Copy restricted to the hyperedges with min_timing <= timing < max_timing (either bound may be None)"""
+        hedges = {hedge: _vertices for hedge, _vertices in self._hedges.items() if _in_window(self._timings[hedge], min_timing, max_timing)}
+        window = copy(self)
+        TimeVaryingHypergraph.__init__(window, hedges, {hedge: self._timings[hedge] for hedge in hedges})
+        return window
+
+    def append(self, hedges: dict, timings: dict):
+        """Copy extended by hyperedges that are strictly later than all hyperedges so far"""
+        _check_append(self._hedges, max(self._timings.values(), default=None), hedges, timings)
+        appended = copy(self)
+        TimeVaryingHypergraph.__init__(appended, {**self._hedges, **hedges}, {**self._timings, **{hedge: timings[hedge] for hedge in hedges}})
+        return appended
+
+
+class CompactTimeVaryingHypergraph(TimingUnit):
+    """Vertices and hyperedges interned to dense ints with CSR incidence arrays and int64 timings.
+
+    Hyperedges are numbered chronologically; the string-keyed accessors translate back to the original IDs.
+    """
+
+    def __init__(self, hedge_ids, vertex_ids, hedge_offsets, hedge_vertices, vertex_offsets, vertex_hedges, timings, datetime_timings=False, timezone=None):
+        self._hedge_ids = tuple(hedge_ids)
+        self._vertex_ids = tuple(vertex_ids)
+        self._hedge_index = {hedge: index for index, hedge in enumerate(self._hedge_ids)}
+        self._vertex_index = {vertex: index for index, vertex in enumerate(self._vertex_ids)}
+
+        self._hedge_offsets = hedge_offsets
+        self._hedge_vertices = hedge_vertices
+        self._vertex_offsets = vertex_offsets
+        self._vertex_hedges = vertex_hedges
+        self._timings = timings
+        self._later_hedges = None
+        self._later_incidences = None
+        self._successor_index = None
+        self.successor_budget = SUCCESSOR_BUDGET
+        self.datetime_timings = datetime_timings
+        self.timezone = timezone
+
+    @classmethod
+    def from_hedges(cls, hedges: dict, timings: dict):
+        vertex_index: dict = {}
+        hedge_offsets = [0]
+        incidence = []
+        for _vertices in hedges.values():
+            incidence += [vertex_index.setdefault(vertex, len(vertex_index)) for vertex in _vertices]
+            hedge_offsets += [len(incidence)]
+        hedge_timings = [timings[hedge] for hedge in hedges]
+        datetime_timings = bool(hedge_timings) and isinstance(hedge_timings[0], datetime)
+        timezone = next((timing.tzinfo for timing in hedge_timings if datetime_timings and timing.tzinfo is not None), None)
+        if datetime_timings:
+            hedge_timings = [microseconds(timing) for timing in hedge_timings]
+        return cls.from_incidence(list(hedges), list(vertex_index), np.array(hedge_offsets, dtype=np.int64), np.array(incidence, dtype=np.int32),
+                                  np.array(hedge_timings, dtype=np.int64), datetime_timings=datetime_timings, timezone=timezone)
+
+    @classmethod
+    def from_incidence(cls, hedge_ids, vertex_ids, hedge_offsets, hedge_vertices, timings, datetime_timings=False, timezone=None):
+        """Interns an incidence in input order: hedge_vertices are codes into vertex_ids and may contain duplicates"""
+        # vertices are numbered in sorted order of their IDs, hyperedges chronologically (stable, ties keep input order)
+        vertex_order = sorted(range(len(vertex_ids)), key=vertex_ids.__getitem__)
+        vertex_codes = np.empty(len(vertex_ids), dtype=np.int32)
+        vertex_codes[vertex_order] = np.arange(len(vertex_ids), dtype=np.int32)
+        hedge_order = np.argsort(timings, kind='stable')
+        hedge_codes = np.empty(len(hedge_ids), dtype=np.int32)
+        hedge_codes[hedge_order] = np.arange(len(hedge_ids), dtype=np.int32)
+
+        member_hedges = hedge_codes[np.repeat(np.arange(len(hedge_ids)), np.diff(hedge_offsets))]
+        member_vertices = vertex_codes[hedge_vertices]
+        order = np.lexsort((member_vertices, member_hedges))
+        member_hedges, member_vertices = member_hedges[order], member_vertices[order]
+        unique = np.ones(len(order), dtype=bool)
+        unique[1:] = (member_hedges[1:] != member_hedges[:-1]) | (member_vertices[1:] != member_vertices[:-1])
+        member_hedges, hedge_vertices = member_hedges[unique], member_vertices[unique]
+        hedge_offsets = np.zeros(len(hedge_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(member_hedges, minlength=len(hedge_ids)), out=hedge_offsets[1:])
+
+        # transpose: the stable sort keeps the hyperedges of each vertex in chronological order
+        order = np.argsort(hedge_vertices, kind='stable')
+        vertex_hedges = member_hedges[order]
+        vertex_offsets = np.zeros(len(vertex_ids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(hedge_vertices, minlength=len(vertex_ids)), out=vertex_offsets[1:])
+
+        return cls([hedge_ids[hedge] for hedge in hedge_order], [vertex_ids[vertex] for vertex in vertex_order],
+                   hedge_offsets, hedge_vertices, vertex_offsets, vertex_hedges, np.asarray(timings, dtype=np.int64)[hedge_order],
+                   datetime_timings=datetime_timings, timezone=timezone)
+
+    def arrays(self):
+        return self._hedge_offsets, self._hedge_vertices, self._vertex_offsets, self._vertex_hedges, self._timings
+
+    def views(self):
+        return tuple(memoryview(array) for array in self.arrays())
+
+    def later_hyperedges(self):
+        # per hyperedge, the index of the first hyperedge with a strictly later timing
+        if self._later_hedges is None:
+            self._later_hedges = np.searchsorted(self._timings, self._timings, side='right')
+        return self._later_hedges
+
+    def later_incidences(self):
+        # per incidence of a hyperedge and a vertex, where the strictly later hyperedges begin in those of the vertex
+        if self._later_incidences is None:
+            num_hedges = np.int64(self.num_hyperedges())
+            vertex_keys = np.repeat(np.arange(self.num_vertices(), dtype=np.int64), np.diff(self._vertex_offsets)) * num_hedges + self._vertex_hedges
+            self._later_incidences = np.searchsorted(vertex_keys, self._hedge_vertices * num_hedges + np.repeat(self.later_hyperedges(), np.diff(self._hedge_offsets)))
+        return self._later_incidences
+
+    def successor_index(self, memory_budget=None, threads=1, arrays=None):
+        """The SuccessorIndex of the hypergraph, built with memory_budget (default successor_budget) and threads (or from materialized arrays) on the first call"""
+        if self._successor_index is None:
+            self._successor_index = SuccessorIndex(self, self.successor_budget if memory_budget is None else memory_budget, threads, arrays)
+        return self._successor_index
+
+    def window(self, min_timing=None, max_timing=None):
+        """Sub-hypergraph of the hyperedges with min_timing <= timing < max_timing and their vertices"""
+        start = 0 if min_timing is None else int(np.searchsorted(self._timings, self.from_timing(min_timing), side='left'))
+        stop = len(self._timings) if max_timing is None else int(np.searchsorted(self._timings, self.from_timing(max_timing), side='left'))
+        stop = max(start, stop)
+        members = self._hedge_vertices[self._hedge_offsets[start]:self._hedge_offsets[stop]]
+        window_vertices, window_members = np.unique(members, return_inverse=True)
+        return self.from_incidence(self._hedge_ids[start:stop], [self._vertex_ids[vertex] for vertex in window_vertices.tolist()],
+                                   self._hedge_offsets[start:stop + 1] - self._hedge_offsets[start], window_members.astype(np.int32),
+                                   self._timings[start:stop], datetime_timings=self.datetime_timings, timezone=self.timezone)
+
+    def append(self, hedges: dict, timings: dict):
+        """New hypergraph extended by hyperedges that are strictly later than all hyperedges so far.
+
+        The hyperedges keep their indices and the new ones are numbered after them; vertex indices may shift, as they
+        follow the sorted vertex IDs.
+        """
+        _check_append(self._hedge_index, self.to_timing(self.timing(-1)) if self.num_hyperedges() else None, hedges, timings)
+        vertex_index = dict(self._vertex_index)
+        hedge_offsets = [int(self._hedge_offsets[-1])]
+        incidence = []
+        for _vertices in hedges.values():
+            incidence += [vertex_index.setdefault(vertex, len(vertex_index)) for vertex in _vertices]
+            hedge_offsets += [hedge_offsets[0] + len(incidence)]
+        datetime_timings = self.datetime_timings if self.num_hyperedges() else any(isinstance(timing, datetime) for timing in timings.values())
+        timezone = self.timezone if self.num_hyperedges() else next((timing.tzinfo for timing in timings.values() if isinstance(timing, datetime) and timing.tzinfo is not None), None)
+        hedge_timings = [microseconds(timings[hedge]) if datetime_timings else timings[hedge] for hedge in hedges]
+        return self.from_incidence([*self._hedge_ids, *hedges], list(vertex_index),
+                                   np.concatenate([self._hedge_offsets, np.array(hedge_offsets[1:], dtype=np.int64)]),
+                                   np.concatenate([self._hedge_vertices, np.array(incidence, dtype=np.int32)]),
+                                   np.concatenate([self._timings, np.array(hedge_timings, dtype=np.int64)]), datetime_timings=datetime_timings, timezone=timezone)
+
+    def num_vertices(self):
+        return len(self._vertex_ids)
+
+    def num_hyperedges(self):
+        return len(self._hedge_ids)
+
+    def vertex_ids(self):
+        return self._vertex_ids
+
+    def hyperedge_ids(self):
+        return self._hedge_ids
+
+    def vertex_index(self, vertex):
+        if vertex in self._vertex_index:
+            return self._vertex_index[vertex]
+        raise EntityNotFound(f'Unknown vertex {vertex}')
+
+    def hyperedge_index(self, hedge):
+        if hedge in self._hedge_index:
+            return self._hedge_index[hedge]
+        raise EntityNotFound(f'Unknown hyperedge {hedge}')
+
+    def incident_vertices(self, hedge_index):
+        return self._hedge_vertices[self._hedge_offsets[hedge_index]:self._hedge_offsets[hedge_index + 1]]
+
+    def incident_hyperedges(self, vertex_index):
+        return self._vertex_hedges[self._vertex_offsets[vertex_index]:self._vertex_offsets[vertex_index + 1]]
+
+    def timing(self, hedge_index):
+        return int(self._timings[hedge_index])
+
+    def timings(self, entity=None):
+        if entity is None:
+            return {hedge: self.to_timing(int(timing)) for hedge, timing in zip(self._hedge_ids, self._timings)}
+        return self.to_timing(self.timing(self._hedge_index[entity]))
+
+    def vertices(self, hedge=None):
+        if hedge is None:
+            return set(self._vertex_ids)
+        return {self._vertex_ids[vertex] for vertex in self.incident_vertices(self.hyperedge_index(hedge))}
+
+    def hyperedges(self, vertex=None):
+        if vertex is None:
+            return set(self._hedge_ids)
+        return {self._hedge_ids[hedge] for hedge in self.incident_hyperedges(self.vertex_index(vertex))}
+
+
+class SuccessorIndex:
+    """Per hyperedge, its distinct strictly later successors (the later hyperedges of its vertices) in chronological order.
+
+    If all successor lists fit into memory_budget bytes, they are materialized as CSR arrays (built in batches on
+    threads); otherwise they are computed when requested and the most recently used ones are kept up to memory_budget.
+    successors() returns memoryviews, so iterating them yields ints.
+    """
+
+    def __init__(self, hypergraph: CompactTimeVaryingHypergraph, memory_budget=SUCCESSOR_BUDGET, threads=1, arrays=None):
+        self._hedge_offsets, self._hedge_vertices, self._vertex_offsets, self._vertex_hedges, _ = hypergraph.arrays()
+        self._later_incidences = hypergraph.later_incidences()
+        self.memory_budget = memory_budget
+        self._cache: OrderedDict = OrderedDict()
+        self._cached_bytes = 0
+        if arrays is None:
+            relaxations = np.concatenate([[0], np.cumsum(self._vertex_offsets[self._hedge_vertices + 1] - self._later_incidences)])[self._hedge_offsets]
+            if (relaxations[-1] + len(relaxations)) * 8 <= memory_budget:  # upper bound of the materialized arrays
+                arrays = self._materialize(relaxations, hypergraph.num_hyperedges(), threads)
+        self._arrays = arrays
+        self._views = tuple(memoryview(array) for array in arrays) if arrays else None
+
+    def arrays(self):
+        """The offsets and successors of the materialized index or None"""
+        return self._arrays
+
+    def successors(self, hedge):
+        if self._views is not None:
+            offsets, successors = self._views
+            return successors[offsets[hedge]:offsets[hedge + 1]]
+        if hedge in self._cache:
+            self._cache.move_to_end(hedge)
+            return self._cache[hedge]
+        incidences = slice(self._hedge_offsets[hedge], self._hedge_offsets[hedge + 1])
+        positions = ranges(self._later_incidences[incidences], self._vertex_offsets[self._hedge_vertices[incidences] + 1])
+        successors = memoryview(np.unique(self._vertex_hedges[positions]).astype(np.int32))
+        self._cache[hedge] = successors
+        self._cached_bytes += successors.nbytes + LRU_ENTRY_BYTES
+        while self._cached_bytes > self.memory_budget and self._cache:
+            self._cached_bytes -= self._cache.popitem(last=False)[1].nbytes + LRU_ENTRY_BYTES
+        return successors
+
+    def _materialize(self, relaxations, num_hedges, threads):
+        # batches of hyperedges with about SUCCESSOR_BATCH relaxations each
+        bounds = np.unique(np.concatenate([np.searchsorted(relaxations, np.arange(0, relaxations[-1], SUCCESSOR_BATCH)), [num_hedges]]))
+        batches = list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+        with ThreadPoolExecutor(max(1, threads)) as executor:
+            results = list(executor.map(lambda batch: self._batch(*batch, num_hedges), batches))
+        offsets = np.zeros(num_hedges + 1, dtype=np.int64)
+        np.cumsum(np.concatenate([counts for counts, _ in results] or [np.zeros(num_hedges, dtype=np.int64)]), out=offsets[1:])
+        return offsets, np.concatenate([successors for _, successors in results] or [np.empty(0, dtype=np.int32)])
+
+    def _batch(self, start, stop, num_hedges):
+        incidences = slice(self._hedge_offsets[start], self._hedge_offsets[stop])
+        starts, stops = self._later_incidences[incidences], self._vertex_offsets[self._hedge_vertices[incidences] + 1]
+        owners = np.repeat(np.repeat(np.arange(start, stop, dtype=np.int64), np.diff(self._hedge_offsets[start:stop + 1])), stops - starts)
+        keys = np.unique(owners * num_hedges + self._vertex_hedges[ranges(starts, stops)])
+        return np.bincount(keys // num_hedges - start, minlength=stop - start), (keys % num_hedges).astype(np.int32)
+
+
+def ranges(starts, stops):
+    # concatenation of the ranges [starts[i], stops[i])
+    lengths = stops - starts
+    return np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum(), dtype=np.int64)
+
 
 class CommunicationNetwork(TimeVaryingHypergraph):
 
@@ -55,15 +389,287 @@ class CommunicationNetwork(TimeVaryingHypergraph):
     def participants(self, channel=None):
         return self.vertices(channel)
 
+    def compact(self):
+        return CompactCommunicationNetwork.from_hedges(self._hedges, self._timings, name=self.name)
+
+    @classmethod
+    def from_json(cls, file_path, name=None, use_cache=True, threads=1):
+        compact = CompactCommunicationNetwork.from_json(file_path, use_cache=use_cache, threads=threads)
+        vertex_ids = compact.vertex_ids()
+        hedges = {hedge: {vertex_ids[vertex] for vertex in compact.incident_vertices(index)} for index, hedge in enumerate(compact.hyperedge_ids())}
+        return cls(hedges, compact.timings(), name=name)
+
+
+class CompactCommunicationNetwork(CompactTimeVaryingHypergraph):
+
+    def __init__(self, *args, name=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.name = name
+
+    @classmethod
+    def from_hedges(cls, hedges: dict, timings: dict, name=None):
+        network = super().from_hedges(hedges, timings)
+        network.name = name
+        return network
+
+    def window(self, min_timing=None, max_timing=None):
+        network = super().window(min_timing, max_timing)
+        network.name = self.name
+        return network
+
+    def append(self, hedges: dict, timings: dict):
+        network = super().append(hedges, timings)
+        network.name = self.name
+        return network
+
+    def channels(self, participant=None):
+        return self.hyperedges(participant)
+
+    def participants(self, channel=None):
+        return self.vertices(channel)
+
     @classmethod
-    def from_json(cls, file_path, name=None):
+    def from_json(cls, file_path, name=None, use_cache=True, threads=1):
+        """Streams the channels from file_path into the compact incidence; threads > 1 decompresses multi-stream .bz2/.zst files in parallel"""
         file_path = Path(file_path)
-        with file_path.open('rb') as file:
-            if file_path.suffix == '.bz2':
-                raw_data = json.loads(bz2.decompress(file.read()))
-            else:
-                raw_data = json.loads(file.read())
-            hedges = {str(chan_id): set(channel['participants']) for chan_id, channel in raw_data.items()}
-            timings = {str(chan_id): datetime.fromisoformat(channel['end']) for chan_id, channel in raw_data.items()}
-
-        return cls(hedges, timings, name=name)
+        cache_path = file_path.with_name(f'{file_path.name}.cache')
+        if use_cache:
+            content_hash = file_hash(file_path)
+            network = read_cache(cache_path, content_hash)
+            if network is not None:
+                network.name = name
+                return network
+
+        hedge_ids = []
+        vertex_index: dict = {}
+        hedge_offsets = array('q', [0])
+        hedge_vertices = array('i')
+        ends = []
+        for chan_id, channel in iter_json_items(codecs.iterdecode(iter_decompressed(file_path, threads), 'utf-8')):
+            hedge_ids += [str(chan_id)]
+            hedge_vertices.extend(vertex_index.setdefault(participant, len(vertex_index)) for participant in channel['participants'])
+            hedge_offsets.append(len(hedge_vertices))
+            ends += [channel['end']]
+        network = cls.from_incidence(hedge_ids, list(vertex_index), np.frombuffer(hedge_offsets, dtype=np.int64), np.frombuffer(hedge_vertices, dtype=np.intc),
+                                     iso_microseconds(ends), datetime_timings=True, timezone=datetime.fromisoformat(ends[0]).tzinfo if ends else None)
+        network.name = name
+        if use_cache:
+            with suppress(OSError):
+                write_cache(cache_path, network, content_hash)
+        return network
+
+
+def microseconds(timing: datetime):
+    """Microseconds since EPOCH of a datetime, since AWARE_EPOCH (in UTC) if it is timezone-aware"""
+    return (timing - (EPOCH if timing.tzinfo is None else AWARE_EPOCH)) // MICROSECOND
+
+
+def dump_timezone(tzinfo):
+    """JSON representation of the timezone of a hypergraph: the key of a ZoneInfo, the UTC offset in seconds of a fixed offset, or None"""
+    if tzinfo is None or isinstance(tzinfo, ZoneInfo):
+        return tzinfo and tzinfo.key
+    if tzinfo.utcoffset(None) is None:
+        raise ValueError(f'Cannot record the timezone {tzinfo}, which is neither a ZoneInfo nor a fixed offset')
+    return int(tzinfo.utcoffset(None).total_seconds())
+
+
+def load_timezone(value):
+    """Timezone of a hypergraph from its dump_timezone representation"""
+    if value is None:
+        return None
+    return ZoneInfo(value) if isinstance(value, str) else timezone(timedelta(seconds=value))
+
+
+def iso_microseconds(timestamps):
+    """Microseconds since EPOCH (see microseconds) of ISO timestamps, parsed by NumPy without creating datetimes.
+
+    Whatever NumPy does not parse cleanly (e.g., time zones or other formats) is parsed by datetime.fromisoformat as before.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        try:
+            parsed = np.array(timestamps, dtype='datetime64[us]').astype(np.int64)
+            if not np.isin(np.datetime64('NaT').astype(np.int64), parsed):
+                return parsed
+        except (ValueError, DeprecationWarning, UserWarning):
+            pass
+    return np.array([microseconds(datetime.fromisoformat(timestamp)) for timestamp in timestamps], dtype=np.int64)
+
+
+def _in_window(timing, min_timing, max_timing):
+    return (min_timing is None or min_timing <= timing) and (max_timing is None or timing < max_timing)
+
+
+def _check_append(known_hedges, latest_timing, hedges: dict, timings: dict):
+    for hedge in hedges:
+        if hedge in known_hedges:
+            raise ValueError(f'Hyperedge {hedge} already exists')
+        if latest_timing is not None and not latest_timing < timings[hedge]:
+            raise ValueError(f'Hyperedge {hedge} is not later than the latest hyperedge ({latest_timing})')
+
+
+def file_hash(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        while chunk := file.read(READ_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def iter_json_items(chunks):
+    """Yields the key-value pairs of a top-level JSON object, parsed incrementally from an iterable of text chunks"""
+    decoder = JSONDecoder()
+    chunks = iter(chunks)
+    buffer, position = '', 0
+    expected = '{'
+    key = None
+    while True:
+        position = WHITESPACE.match(buffer, position).end()
+        if position == len(buffer):
+            chunk = next(chunks, None)
+            if chunk is None:
+                raise ValueError('Unexpected end of JSON input')
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        match expected:
+            case '{' | ':':
+                if buffer[position] != expected:
+                    raise ValueError(f'Expected {expected!r} at {buffer[position:position + 20]!r}')
+                position += 1
+                expected = 'key' if expected == '{' else 'value'
+            case ',' if buffer[position] == '}':
+                return
+            case ',':
+                if buffer[position] != ',':
+                    raise ValueError(f'Expected \',\' at {buffer[position:position + 20]!r}')
+                position += 1
+                expected = 'key'
+            case 'key' if buffer[position] == '}':
+                return
+            case 'key' | 'value':
+                try:
+                    value, end = decoder.raw_decode(buffer, position)
+                    incomplete = end == len(buffer)  # e.g., a number might continue in the next chunk
+                except JSONDecodeError:
+                    incomplete = True
+                if incomplete:
+                    chunk = next(chunks, None)
+                    if chunk is not None:
+                        buffer, position = buffer[position:] + chunk, 0
+                        continue
+                    value, end = decoder.raw_decode(buffer, position)
+                position = end
+                if expected == 'key':
+                    key, expected = value, ':'
+                else:
+                    yield key, value
+                    expected = ','
+
+
+def iter_decompressed(file_path, threads=1):
+    file_path = Path(file_path)
+    match file_path.suffix:
+        case '.bz2':
+            stream_pattern, decompress_stream, open_stream = BZ2_STREAM, _decompress_bz2_stream, bz2.open
+        case '.zst':
+            if zstandard is None:
+                raise ImportError(f'Reading {file_path} requires zstandard')
+            stream_pattern, decompress_stream, open_stream = ZSTD_FRAME, _decompress_zstd_frame, _open_zstd
+        case _:
+            stream_pattern, decompress_stream, open_stream = None, None, open
+    if threads > 1 and stream_pattern is not None:
+        yield from _iter_parallel_decompressed(file_path.read_bytes(), threads, stream_pattern, decompress_stream, open_stream)
+        return
+    with open_stream(file_path, 'rb') as file:
+        while chunk := file.read(READ_SIZE):
+            yield chunk
+
+
+def _iter_parallel_decompressed(data, threads, stream_pattern, decompress_stream, open_stream):
+    # candidate stream starts may be false positives inside compressed data; a segment that does not decompress to
+    # exactly one complete stream makes the rest fall back to sequential decompression
+    starts = [match.start() for match in stream_pattern.finditer(data) if match.start() > 0]
+    bounds = list(zip([0] + starts, starts + [len(data)]))
+    view = memoryview(data)
+    with ThreadPoolExecutor(threads) as executor:
+        futures: deque = deque()
+        submitted = 0
+        for start, _ in bounds:
+            while submitted < len(bounds) and len(futures) < 2 * threads:  # bounded read-ahead
+                futures.append(executor.submit(decompress_stream, view[bounds[submitted][0]:bounds[submitted][1]]))
+                submitted += 1
+            chunk = futures.popleft().result()
+            if chunk is None:
+                for future in futures:
+                    future.cancel()
+                with open_stream(io.BytesIO(view[start:]), 'rb') as file:
+                    while chunk := file.read(READ_SIZE):
+                        yield chunk
+                return
+            yield chunk
+
+
+def _decompress_bz2_stream(segment):
+    decompressor = bz2.BZ2Decompressor()
+    try:
+        chunk = decompressor.decompress(segment)
+    except OSError:
+        return None
+    return chunk if decompressor.eof and not decompressor.unused_data else None
+
+
+def _decompress_zstd_frame(segment):
+    decompressor = zstandard.ZstdDecompressor().decompressobj()
+    try:
+        chunk = decompressor.decompress(segment)
+    except zstandard.ZstdError:
+        return None
+    return chunk if decompressor.eof and not decompressor.unused_data else None
+
+
+def _open_zstd(file, mode='rb'):
+    return zstandard.ZstdDecompressor().stream_reader(file if hasattr(file, 'read') else open(file, mode), read_across_frames=True)
+
+
+def array_layout(arrays):
+    layout = []
+    size = 0
+    for array in arrays:
+        layout += [(array.dtype.str, size, len(array))]
+        size += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    return layout, size
+
+
+def write_cache(cache_path, hypergraph: CompactTimeVaryingHypergraph, content_hash):
+    """Binary cache file: magic, header length, JSON header (hash, IDs, array layout), then the aligned CSR arrays"""
+    arrays = hypergraph.arrays()
+    layout, _ = array_layout(arrays)
+    header = json.dumps({'version': CACHE_VERSION, 'hash': content_hash, 'layout': layout, 'datetime_timings': hypergraph.datetime_timings,
+                         'timezone': dump_timezone(hypergraph.timezone), 'hedge_ids': hypergraph.hyperedge_ids(), 'vertex_ids': hypergraph.vertex_ids()})
+    header = header if isinstance(header, bytes) else header.encode()
+    data_offset = -(-(len(CACHE_MAGIC) + 8 + len(header)) // ALIGNMENT) * ALIGNMENT
+    temp_path = cache_path.with_name(f'{cache_path.name}.tmp')
+    with open(temp_path, 'wb') as file:
+        file.write(CACHE_MAGIC + len(header).to_bytes(8, 'little') + header)
+        for array, (_, offset, _) in zip(arrays, layout):
+            file.seek(data_offset + offset)
+            file.write(np.ascontiguousarray(array).tobytes())
+    os.replace(temp_path, cache_path)
+
+
+def read_cache(cache_path, content_hash):
+    """Memory-maps the cache if it exists and matches content_hash, otherwise returns None"""
+    if not os.path.exists(cache_path):
+        return None
+    with open(cache_path, 'rb') as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    if buffer[:len(CACHE_MAGIC)] != CACHE_MAGIC:
+        return None
+    header_length = int.from_bytes(buffer[len(CACHE_MAGIC):len(CACHE_MAGIC) + 8], 'little')
+    header = json.loads(buffer[len(CACHE_MAGIC) + 8:len(CACHE_MAGIC) + 8 + header_length])
+    if header['version'] != CACHE_VERSION or header['hash'] != content_hash:
+        return None
+    data_offset = -(-(len(CACHE_MAGIC) + 8 + header_length) // ALIGNMENT) * ALIGNMENT
+    arrays = [np.frombuffer(buffer, dtype=dtype, count=length, offset=data_offset + offset) for dtype, offset, length in header['layout']]
+    return CompactCommunicationNetwork(header['hedge_ids'], header['vertex_ids'], *arrays, datetime_timings=header['datetime_timings'],
+                                       timezone=load_timezone(header['timezone']))
@@ -0,0 +1,112 @@
+from contextlib import contextmanager
+import heapq
+import time
+
+import numpy as np
+import pandas as pd
+
+from . import minimal_paths
+from .minimal_paths import multi_source_dijkstra_all, bfs_hedge_hops
+from .model import CompactTimeVaryingHypergraph
+
+COST_ESTIMATES = ('degree', 'incidences', 'profile')
+STATS_COLUMNS = {'source': object, 'seconds': np.float64, 'heap_pushes': np.int64, 'heap_pops': np.int64, 'relaxations': np.int64, 'reached': np.int64, 'result_bytes': np.int64}
+
+
+class CountingHeapq:
+    """Stands in for the heapq module in minimal_paths while profiling and counts the heap operations"""
+
+    def __init__(self):
+        self.pushes = 0
+        self.pops = 0
+
+    def heappush(self, heap, item):
+        self.pushes += 1
+        heapq.heappush(heap, item)
+
+    def heappop(self, heap):
+        self.pops += 1
+        return heapq.heappop(heap)
+
+    def heapify(self, heap):
+        self.pushes += len(heap)
+        heapq.heapify(heap)
+
+
+@contextmanager
+def counting_heap():
+    # the engines look up heapq as a global of minimal_paths on every call, so without profiling nothing is counted
+    counter = CountingHeapq()
+    minimal_paths.heapq = counter
+    try:
+        yield counter
+    finally:
+        minimal_paths.heapq = heapq
+
+
+def hyperedge_relaxations(hypergraph: CompactTimeVaryingHypergraph):
+    """Per hyperedge, the number of its distinct strictly later successors (see SuccessorIndex), i.e., the relaxations when expanding it"""
+    successor_index = hypergraph.successor_index()
+    if successor_index.arrays() is not None:
+        return np.diff(successor_index.arrays()[0])
+    return np.fromiter((len(successor_index.successors(hedge)) for hedge in range(hypergraph.num_hyperedges())), dtype=np.int64, count=hypergraph.num_hyperedges())
+
+
+def source_relaxations(hypergraph: CompactTimeVaryingHypergraph, source: int, relaxations=None):
+    """Relaxations of Dijkstra's algorithm via hyperedges from the source index: those of all hyperedges reachable from it"""
+    if relaxations is None:
+        relaxations = hyperedge_relaxations(hypergraph)
+    return int(relaxations[np.fromiter(bfs_hedge_hops(hypergraph, source), dtype=np.int64)].sum())
+
+
+def profile_multi_source_all(hypergraph: CompactTimeVaryingHypergraph, sources, single_source_dijkstra, relaxations=None):
+    """multi_source_dijkstra_all one source at a time, returning the packed block and a row of STATS_COLUMNS per source.
+
+    relaxations are counted independently of the engine as the time-respecting successors of all hyperedges reachable
+    from the source (see source_relaxations), heap operations as the heapq calls of the engine.
+    """
+    if relaxations is None:
+        relaxations = hyperedge_relaxations(hypergraph)
+    blocks, stats = [], []
+    for source_vertex in sources:
+        with counting_heap() as counter:
+            start = time.perf_counter()
+            block = multi_source_dijkstra_all(hypergraph, [source_vertex], single_source_dijkstra)
+            seconds = time.perf_counter() - start
+        stats += [(source_vertex, seconds, counter.pushes, counter.pops, source_relaxations(hypergraph, hypergraph.vertex_index(source_vertex), relaxations),
+                   len(block[0]), sum(column.nbytes for column in block))]
+        blocks += [block]
+    return tuple(np.concatenate(columns, dtype=columns[0].dtype) for columns in zip(*blocks)), stats
+
+
+def estimate_costs(hypergraph: CompactTimeVaryingHypergraph, sources, estimate='incidences', profile: pd.DataFrame = None):
+    """Expected relative cost per source: its degree, the sizes of its hyperedges summed up or its seconds in a prior profile.
+
+    Sources missing from the profile (or all sources if there is none) are estimated by their incidences, scaled by the
+    median seconds per incidence of the profiled sources.
+    """
+    hedge_offsets, _, vertex_offsets, vertex_hedges, _ = hypergraph.arrays()
+    indices = np.array([hypergraph.vertex_index(source) for source in sources], dtype=np.int64)
+    if estimate == 'degree':
+        return np.diff(vertex_offsets)[indices].astype(np.float64)
+    incidences = np.concatenate([[0], np.cumsum(np.diff(hedge_offsets)[vertex_hedges])])
+    costs = (incidences[vertex_offsets[indices + 1]] - incidences[vertex_offsets[indices]]).astype(np.float64)
+    if estimate != 'profile' or profile is None or not len(profile):
+        return costs
+    seconds = dict(zip(profile.source.astype(str), profile.seconds))  # the CSV does not keep the type of the participant IDs
+    profiled = np.array([seconds.get(str(source), np.nan) for source in sources], dtype=np.float64)
+    known = ~np.isnan(profiled)
+    scale = np.median(profiled[known] / np.maximum(costs[known], 1)) if known.any() else 1.0
+    return np.where(known, profiled, costs * scale)
+
+
+def summarize(stats: pd.DataFrame, phases: dict, top=10):
+    """Totals, quantiles of the per-source cost and the slowest sources"""
+    return {
+        'sources': len(stats),
+        'phases_seconds': phases,
+        'totals': {column: stats[column].sum().item() for column in list(STATS_COLUMNS)[1:]},
+        'seconds_quantiles': {str(quantile): stats.seconds.quantile(quantile).item() for quantile in (0.5, 0.9, 0.99, 1.0)} if len(stats) else {},
+        'top_percent_share_of_seconds': stats.seconds.nlargest(max(1, len(stats) // 100)).sum().item() / max(stats.seconds.sum().item(), 1e-12),
+        'slowest': stats.nlargest(top, 'seconds').to_dict(orient='records'),
+    }
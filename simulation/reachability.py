@@ -0,0 +1,63 @@
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .model import CompactCommunicationNetwork, CompactTimeVaryingHypergraph
+from .run import AVAILABLE_DATA_SETS
+
+
+def temporal_reachability(hypergraph: CompactTimeVaryingHypergraph):
+    """Reachable vertices of all vertices as Python int bitsets (bit j of entry i: j is reachable from i).
+
+    Walks the hyperedges in reverse chronological order: a hyperedge reaches its own vertices and everything its
+    vertices reach via strictly later hyperedges. Hyperedges with equal timings must not reach each other, so the
+    bitsets of a vertex are only updated once all hyperedges of the same timing have been visited.
+    """
+    hedge_offsets, hedge_vertices, _, _, timings = hypergraph.views()
+    reachable = [0] * hypergraph.num_vertices()
+    pending: list = []
+    pending_timing = None
+    for hedge in reversed(range(hypergraph.num_hyperedges())):
+        if timings[hedge] != pending_timing:
+            for members, hedge_reachable in pending:
+                for vertex in members:
+                    reachable[vertex] |= hedge_reachable
+            pending = []
+            pending_timing = timings[hedge]
+        members = hedge_vertices[hedge_offsets[hedge]:hedge_offsets[hedge + 1]]
+        hedge_reachable = 0
+        for vertex in members:
+            hedge_reachable |= reachable[vertex] | (1 << vertex)
+        pending += [(members, hedge_reachable)]
+    for members, hedge_reachable in pending:
+        for vertex in members:
+            reachable[vertex] |= hedge_reachable
+    return [bits & ~(1 << vertex) for vertex, bits in enumerate(reachable)]
+
+
+def to_bit_matrix(reachable):
+    # row i, byte j // 8, bit j % 8 (little bit order, see np.unpackbits(..., bitorder='little'))
+    row_bytes = (len(reachable) + 7) // 8
+    return np.frombuffer(b''.join(bits.to_bytes(row_bytes, 'little') for bits in reachable), dtype=np.uint8).reshape(len(reachable), row_bytes)
+
+
+def run_reachability():
+    parser = argparse.ArgumentParser(description='Temporal reachability among all participants in code review communication networks')
+    parser.add_argument('--select', type=str, nargs='+', choices=AVAILABLE_DATA_SETS, help='Load a subset of the available data', default=AVAILABLE_DATA_SETS)
+    args = parser.parse_args()
+
+    result_dir_path = Path('./data/reachability/')
+    result_dir_path.mkdir(parents=True, exist_ok=True)
+
+    for name in args.select:
+        communication_network = CompactCommunicationNetwork.from_json(f'./data/networks/{name}.json.bz2', name=name)
+        reachable = temporal_reachability(communication_network)
+        np.save(result_dir_path/f'{name}.npy', to_bit_matrix(reachable))
+        counts = pd.Series([bits.bit_count() for bits in reachable], index=pd.Index(communication_network.vertex_ids(), name='source'), name='reachable')
+        counts.to_csv(result_dir_path/f'{name}.csv.bz2', compression='bz2')
+
+
+if __name__ == '__main__':
+    run_reachability()
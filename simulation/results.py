@@ -0,0 +1,322 @@
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import hashlib
+import mmap
+import multiprocessing as mp
+import os
+
+import numpy as np
+import pandas as pd
+
+from .model import ALIGNMENT, zstandard, ranges, dump_timezone, load_timezone
+from .minimal_paths import DistanceType, latest_departures, compact_extend_all
+
+try:
+    import orjson as json
+except ImportError:
+    import json
+
+COMPLETED_DTYPE = np.dtype(np.int32)
+COLUMNS = {'source': np.dtype(np.int32), 'target': np.dtype(np.int32), **{distance_type.name.lower(): np.dtype(np.int64) for distance_type in DistanceType}}
+FORMATS = ('bz2', 'zstd', 'raw')
+ENCODED_SUFFIXES = {'zstd': '.dist.zst', 'raw': '.dist'}
+ENCODED_MAGIC = b'TVHDISTS'
+ENCODED_VERSION = 1
+ENCODED_BLOCK_ROWS = 1 << 22
+ZSTD_LEVEL = 9
+
+
+class ResultStore:
+    """Append-only columnar store for the packed blocks returned by multi_source_dijkstra_all.
+
+    Each column is a raw file of native integers (participant codes, distances in the network's time unit), so memory
+    stays bounded by one block while writing and the columns can be memory-mapped for reading. After each block, the
+    row count and the codes of the completed sources are committed to meta.json and completed.bin, so that a run can
+    be resumed from the last committed block.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._meta = json.loads((self.path/'meta.json').read_bytes())
+        self.participants = tuple(json.loads((self.path/'participants.json').read_bytes()))
+        self._participant_index = {participant: index for index, participant in enumerate(self.participants)}
+
+    @classmethod
+    def create(cls, path, hypergraph):
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        for column in (*COLUMNS, 'completed'):
+            (path/f'{column}.bin').write_bytes(b'')
+        (path/'participants.json').write_bytes(dumps(list(hypergraph.vertex_ids())))
+        write_meta(path, {'rows': 0, 'completed': 0, 'datetime_timings': hypergraph.datetime_timings, 'timezone': dump_timezone(hypergraph.timezone),
+                          'hyperedges': hypergraph.num_hyperedges(),
+                           'latest_timing': hypergraph.timing(-1) if hypergraph.num_hyperedges() else None,
+                           'fingerprint': fingerprint(hypergraph, hypergraph.num_hyperedges())})
+        return cls(path)
+
+    @classmethod
+    def resume(cls, path, hypergraph):
+        if not (Path(path)/'meta.json').exists():
+            return cls.create(path, hypergraph)
+        store = cls(path)
+        if store.participants != hypergraph.vertex_ids():
+            raise ValueError(f'Cannot resume {path}: stored participants differ from the network')
+        if 'fingerprint' in store._meta and (store._meta['hyperedges'] != hypergraph.num_hyperedges()
+                                             or store._meta['fingerprint'] != fingerprint(hypergraph, hypergraph.num_hyperedges())):
+            raise ValueError(f'Cannot resume {path}: stored results were computed on different channels')
+        # drop whatever was written after the last committed block
+        for column, dtype in COLUMNS.items():
+            os.truncate(store.path/f'{column}.bin', store.rows() * dtype.itemsize)
+        os.truncate(store.path/'completed.bin', store._meta['completed'] * COMPLETED_DTYPE.itemsize)
+        return store
+
+    def rows(self):
+        return self._meta['rows']
+
+    def datetime_timings(self):
+        return self._meta['datetime_timings']
+
+    def timezone(self):
+        return load_timezone(self._meta.get('timezone'))
+
+    def completed(self):
+        codes = np.fromfile(self.path/'completed.bin', dtype=COMPLETED_DTYPE, count=self._meta['completed'])
+        return {self.participants[code] for code in codes.tolist()}
+
+    def append(self, block, sources):
+        for column, array in (*zip(COLUMNS, block), ('completed', [self._participant_index[source] for source in sources])):
+            with (self.path/f'{column}.bin').open('ab') as file:
+                file.write(np.asarray(array, dtype=COLUMNS.get(column, COMPLETED_DTYPE)).tobytes())
+                file.flush()
+                os.fsync(file.fileno())
+        self._meta['rows'] += len(block[0])
+        self._meta['completed'] += len(sources)
+        write_meta(self.path, self._meta)
+
+    def source_runs(self):
+        """The rows [starts[code], stops[code]) of each source by participant code (empty without rows), as the rows of a source are contiguous"""
+        starts = np.zeros(len(self.participants), dtype=np.int64)
+        stops = np.zeros(len(self.participants), dtype=np.int64)
+        if self.rows():
+            sources = self.column('source')
+            bounds = np.concatenate([[0], np.flatnonzero(np.diff(sources)) + 1, [self.rows()]])
+            starts[sources[bounds[:-1]]], stops[sources[bounds[:-1]]] = bounds[:-1], bounds[1:]
+        return starts, stops
+
+    def column(self, column):
+        if self.rows() == 0:
+            return np.empty(0, dtype=COLUMNS[column])
+        return np.memmap(self.path/f'{column}.bin', dtype=COLUMNS[column], mode='r', shape=(self.rows(),))
+
+    def distance_series(self, distance_type: DistanceType):
+        return _distance_series(self.participants, self.datetime_timings(), self.column('source'), self.column('target'), self.column(distance_type.name.lower()), distance_type,
+                                 self.timezone())
+
+    def to_frame(self):
+        return distance_frame(self.participants, self.datetime_timings(), {column: self.column(column) for column in COLUMNS}, self.timezone())
+
+
+def distance_frame(participants, datetime_timings, columns: dict, timezone=None):
+    """The merged results: a column per distance type (native timings for datetimes, in timezone if given), indexed by categorical source and target participants"""
+    return pd.concat([_distance_series(participants, datetime_timings, columns['source'], columns['target'], columns[distance_type.name.lower()], distance_type, timezone)
+                      for distance_type in DistanceType], axis=1).sort_index()
+
+
+def _distance_series(participants, datetime_timings, sources, targets, distances, distance_type: DistanceType, timezone=None):
+    distance_type_name = distance_type.name.lower()
+    if datetime_timings and distance_type == DistanceType.FASTEST:
+        distances = distances.astype('timedelta64[us]')
+    elif datetime_timings and distance_type == DistanceType.FOREMOST:
+        distances = distances.astype('datetime64[us]')
+        if timezone is not None:
+            distances = pd.DatetimeIndex(distances).tz_localize('UTC').tz_convert(timezone)
+    else:
+        distances = np.array(distances, dtype=np.int64)  # canonical dtype instance, otherwise the pickled result differs
+    category = pd.api.types.CategoricalDtype(categories=participants, ordered=False)
+    min_distances_df = pd.DataFrame({
+        'source': pd.Categorical.from_codes(sources, dtype=category),
+        'target': pd.Categorical.from_codes(targets, dtype=category),
+        'distance': distances})
+    series = min_distances_df.set_index(['source', 'target']).distance.rename(distance_type_name).sort_index()
+    # whether sort_index reorders the rows (not if they are sorted already, e.g., after update) changes how the
+    # datetimes are pickled; as_unit normalizes them to the pickle of a fresh run
+    return series.dt.as_unit('us') if datetime_timings and distance_type != DistanceType.SHORTEST else series
+
+
+def update(store: ResultStore, hypergraph, path, chunk_size=64):
+    """Writes the results of store, updated with the hyperedges that hypergraph has in addition, to a new store at path.
+
+    hypergraph must extend the network the results were computed on by strictly later hyperedges (see append). Only
+    the sources that can reach the new hyperedges are recomputed, and only on the new hyperedges (compact_extend_all).
+    """
+    if 'latest_timing' not in store._meta:
+        raise ValueError(f'Cannot update {store.path}: the results do not record the network they were computed on')
+    if len(store.completed()) != len(store.participants):
+        raise ValueError(f'Cannot update {store.path}: the results are incomplete, resume them first')
+    latest_timing = store._meta['latest_timing']
+    first_new = 0 if latest_timing is None else int(np.searchsorted(hypergraph.arrays()[4], latest_timing, side='right'))
+    if first_new != store._meta['hyperedges'] or fingerprint(hypergraph, first_new) != store._meta['fingerprint']:
+        raise ValueError(f'Cannot update {store.path}: the network does not extend the one the results were computed on by later hyperedges')
+
+    codes = np.array([hypergraph.vertex_index(participant) for participant in store.participants], dtype=np.int32)
+    run_starts, run_stops = store.source_runs()
+    columns = [store.column(column) for column in COLUMNS]
+    members, records = latest_departures(hypergraph, first_new)
+
+    updated = ResultStore.create(path, hypergraph)
+    participants = hypergraph.vertex_ids()
+    for chunk in range(0, len(participants), chunk_size):
+        block = [[] for _ in COLUMNS]
+        for source in range(chunk, min(chunk + chunk_size, len(participants))):
+            old_source = store._participant_index.get(participants[source])
+            start, stop = (0, 0) if old_source is None else (run_starts[old_source], run_stops[old_source])
+            targets, *distances = compact_extend_all(hypergraph, source, first_new, codes[columns[1][start:stop]],
+                                                     *(np.asarray(column[start:stop]) for column in columns[2:]), (members, records[source]))
+            for column, array in zip(block, (np.full(len(targets), source, dtype=np.int32), targets, *distances)):
+                column += [array]
+        updated.append([np.concatenate(column) for column in block], participants[chunk:chunk + chunk_size])
+    return updated
+
+
+def merge(store: ResultStore, result_dir_path, name, format='bz2', threads=1):
+    """Writes the results of store as .csv.bz2 and .pickle.bz2 files or, for the other FORMATS, encoded (see write_encoded)"""
+    if format != 'bz2':
+        write_encoded(store, Path(result_dir_path)/f'{name}{ENCODED_SUFFIXES[format]}', format, threads)
+        return
+    result = store.to_frame()
+    result.info(verbose=True, memory_usage=True, show_counts=True)
+    result.to_csv(Path(result_dir_path)/f'{name}.csv.bz2', compression='bz2')
+    result.to_pickle(Path(result_dir_path)/f'{name}.pickle.bz2', compression='bz2')
+
+
+def write_encoded(store: ResultStore, path, codec='zstd', threads=1, block_rows=ENCODED_BLOCK_ROWS):
+    """Writes the results of store sorted by source and target code in blocks of consecutive sources with about block_rows rows.
+
+    Per block, the number of rows of each source, the targets delta-encoded per source and the distances in the
+    network's time unit are stored in the smallest integer types that hold them, either compressed with zstd (blocks
+    on threads) or raw at aligned offsets, so that the file can be memory-mapped. A JSON trailer holds the layout.
+    """
+    if codec == 'zstd' and zstandard is None:
+        raise ImportError(f'Writing {path} requires zstandard')
+    path = Path(path)
+    run_starts, run_stops = store.source_runs()
+    rows = np.concatenate([[0], np.cumsum(run_stops - run_starts)])
+    bounds = np.unique(np.concatenate([[0], np.searchsorted(rows, np.arange(0, rows[-1], block_rows), side='right') - 1, [len(store.participants)]]))
+    columns = [store.column(column) for column in COLUMNS if column != 'source']
+
+    def encode(first, stop):
+        counts = run_stops[first:stop] - run_starts[first:stop]
+        positions = ranges(run_starts[first:stop], run_stops[first:stop])
+        order = np.argsort(np.repeat(np.arange(stop - first, dtype=np.int64), counts) * len(store.participants) + columns[0][positions])
+        positions = positions[order]
+        targets = columns[0][positions].astype(np.int64)
+        deltas = np.diff(targets, prepend=0)
+        offsets = np.cumsum(counts) - counts
+        deltas[offsets[counts > 0]] = targets[offsets[counts > 0]]  # the first target of each source is stored as is
+        arrays = [counts, deltas, *(np.asarray(column[positions]) for column in columns[1:])]
+        arrays = [np.ascontiguousarray(array, dtype=_smallest_dtype(array)) for array in arrays]
+        data = [array.tobytes() if codec == 'raw' else zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(array.tobytes()) for array in arrays]
+        return first, stop, int(counts.sum()), arrays, data
+
+    blocks = []
+    temp_path = path.with_name(f'{path.name}.tmp')
+    with open(temp_path, 'wb') as file, ThreadPoolExecutor(max(1, threads)) as executor:
+        file.write(ENCODED_MAGIC)
+        futures: deque = deque()
+        pending = iter(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+        while True:
+            while len(futures) < 2 * max(1, threads) and (bound := next(pending, None)):  # bounded read-ahead
+                futures.append(executor.submit(encode, *bound))
+            if not futures:
+                break
+            first, stop, count, arrays, data = futures.popleft().result()
+            layout = []
+            for array, chunk in zip(arrays, data):
+                file.write(b'\0' * (-file.tell() % ALIGNMENT))
+                layout += [(array.dtype.str, file.tell(), len(chunk), len(array))]
+                file.write(chunk)
+            blocks += [{'sources': [first, stop], 'rows': count, 'layout': layout}]
+        trailer = dumps({'version': ENCODED_VERSION, 'codec': codec, 'participants': list(store.participants), 'datetime_timings': store.datetime_timings(),
+                          'timezone': store._meta.get('timezone'), 'rows': int(rows[-1]), 'columns': list(COLUMNS)[1:], 'blocks': blocks})
+        file.write(trailer + len(trailer).to_bytes(8, 'little') + ENCODED_MAGIC)
+    os.replace(temp_path, path)
+
+
+def read_encoded(path, threads=1):
+    """Participants, datetime_timings, the columns (as in COLUMNS), sorted by source and target, and the timezone of a file written by write_encoded"""
+    with open(path, 'rb') as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    if buffer[:len(ENCODED_MAGIC)] != ENCODED_MAGIC or buffer[-len(ENCODED_MAGIC):] != ENCODED_MAGIC:
+        raise ValueError(f'{path} is not an encoded result file')
+    trailer_length = int.from_bytes(buffer[-len(ENCODED_MAGIC) - 8:-len(ENCODED_MAGIC)], 'little')
+    trailer = json.loads(buffer[-len(ENCODED_MAGIC) - 8 - trailer_length:-len(ENCODED_MAGIC) - 8])
+    if trailer['version'] != ENCODED_VERSION:
+        raise ValueError(f'{path} has version {trailer["version"]}, expected {ENCODED_VERSION}')
+    if trailer['codec'] == 'zstd' and zstandard is None:
+        raise ImportError(f'Reading {path} requires zstandard')
+
+    def decode(block):
+        if trailer['codec'] == 'raw':
+            counts, deltas, *distances = (np.frombuffer(buffer, dtype=dtype, count=length, offset=offset) for dtype, offset, _, length in block['layout'])
+        else:
+            counts, deltas, *distances = (np.frombuffer(zstandard.ZstdDecompressor().decompress(buffer[offset:offset + size]), dtype=dtype, count=length)
+                                          for dtype, offset, size, length in block['layout'])
+        source_codes = np.repeat(np.arange(*block['sources'], dtype=np.int32), counts)
+        cumulative = np.cumsum(deltas, dtype=np.int64)
+        before = np.concatenate([[0], cumulative])[np.cumsum(counts, dtype=np.int64) - counts]  # sum of the deltas before each source
+        targets = (cumulative - np.repeat(before, counts)).astype(np.int32)
+        return source_codes, targets, *(distance.astype(np.int64) for distance in distances)
+
+    with ThreadPoolExecutor(max(1, threads)) as executor:
+        blocks = list(executor.map(decode, trailer['blocks']))
+    columns = {column: np.concatenate([block[index] for block in blocks] or [np.empty(0, dtype=dtype)], dtype=dtype)
+               for index, (column, dtype) in enumerate(COLUMNS.items())}
+    return tuple(trailer['participants']), trailer['datetime_timings'], columns, load_timezone(trailer.get('timezone'))
+
+
+def read_frame(path, threads=1):
+    """The merged frame (as written to the .pickle.bz2 files) of a file written by write_encoded"""
+    return distance_frame(*read_encoded(path, threads))
+
+
+def run_merge():
+    parser = argparse.ArgumentParser(description='Merge columnar simulation results into .csv.bz2 and .pickle.bz2 files or an encoded file')
+    parser.add_argument('--select', type=str, nargs='+', help='Names of the networks to merge (default all in data/distances)')
+    parser.add_argument('--format', type=str, choices=FORMATS, default='bz2', help='bz2 for .csv.bz2 and .pickle.bz2 files (default), zstd or raw for an encoded file')
+    parser.add_argument('--threads', type=int, default=mp.cpu_count(), help='Number of threads to compress an encoded file (default # of CPUs)')
+    args = parser.parse_args()
+    if args.format == 'zstd' and zstandard is None:
+        parser.error('--format zstd requires zstandard')
+
+    store_dir_path = Path('./data/distances/')
+    result_dir_path = Path('./data/minimal_paths/')
+    result_dir_path.mkdir(parents=True, exist_ok=True)
+    for name in args.select or sorted(path.name for path in store_dir_path.iterdir() if path.is_dir()):
+        merge(ResultStore(store_dir_path/name), result_dir_path, name, args.format, args.threads)
+
+
+def dumps(obj):
+    dumped = json.dumps(obj)
+    return dumped if isinstance(dumped, bytes) else dumped.encode()
+
+
+def fingerprint(hypergraph, stop):
+    # of the IDs and timings of the first stop hyperedges
+    digest = hashlib.sha256('\0'.join(hypergraph.hyperedge_ids()[:stop]).encode())
+    digest.update(hypergraph.arrays()[4][:stop].tobytes())
+    return digest.hexdigest()
+
+
+def _smallest_dtype(array):
+    return np.result_type(np.min_scalar_type(array.min()), np.min_scalar_type(array.max())) if len(array) else np.dtype(np.uint8)
+
+
+def write_meta(path, meta):
+    (path/'meta.json.tmp').write_bytes(dumps(meta))
+    os.replace(path/'meta.json.tmp', path/'meta.json')
+
+
+if __name__ == '__main__':
+    run_merge()
@@ -1,66 +1,236 @@
 import argparse
+from datetime import datetime
 from pathlib import Path
+import os
+import shutil
+import sys
+import time
 import multiprocessing as mp
+from contextlib import nullcontext
 from concurrent.futures import ProcessPoolExecutor, as_completed
 
+import numpy as np
 import pandas as pd
+
 from tqdm import tqdm
 
-from .model import CommunicationNetwork
-from .minimal_paths import single_source_dijkstra_hyperedges, single_source_dijkstra_vertices, DistanceType
+from .model import CompactCommunicationNetwork, SUCCESSOR_BUDGET, zstandard
+from .minimal_paths import single_source_dijkstra_hyperedges, single_source_dijkstra_vertices, single_source_sweep, single_source_frontier, equivalent_sources, expand_equivalent, SUCCESSOR_ENGINES
+from .shared import SharedHypergraph, attach
+from .results import FORMATS, ResultStore, merge, update, dumps
+from .aggregates import SUMMARY_COLUMNS, histogram_edges, merge_counts, summarize_distributions
+from .distributed import Coordinator, compute_shard, network_spec, parse_address
+from .sampling import estimate, sample_size, stack_counts, stratified_sample
+from .profiling import COST_ESTIMATES, STATS_COLUMNS, estimate_costs, hyperedge_relaxations, summarize
 
 AVAILABLE_DATA_SETS = ('microsoft', )  # other data sets have not been published yet
 
+_worker = {}
+
+
+def _init_worker(descriptor, single_source_dijkstra, profile=False, edges=None, per_source=False):
+    _worker['network'] = attach(descriptor)
+    _worker['single_source_dijkstra'] = single_source_dijkstra
+    _worker['relaxations'] = hyperedge_relaxations(_worker['network']) if profile else None
+    _worker['edges'] = edges
+    _worker['per_source'] = per_source
+
+
+def _multi_source_task(sources):
+    return compute_shard(_worker['network'], sources, _worker['single_source_dijkstra'], _worker['relaxations'], _worker['edges'], _worker['per_source'])
+
+
+def chunk_sources(sources, costs, chunk_size, num_workers):
+    """Chunks of sources, most expensive first, for workers that take the next chunk whenever they are idle.
+
+    Each chunk takes up to 1 / (2 * num_workers) of the remaining cost (guided self-scheduling), so expensive sources
+    start early in chunks of their own, cheap sources follow in chunks of up to chunk_size, and the last chunks are small
+    again to keep all workers busy until the end.
+    """
+    order = np.argsort(-np.asarray(costs, dtype=np.float64), kind='stable')
+    remaining = float(np.sum(costs))
+    chunks, chunk, chunk_cost, target = [], [], 0.0, 0.0
+    for index in order.tolist():
+        if chunk and (len(chunk) == chunk_size or chunk_cost + costs[index] > target):
+            chunks += [chunk]
+            remaining -= chunk_cost
+            chunk, chunk_cost = [], 0.0
+        if not chunk:
+            target = remaining / (2 * num_workers)
+        chunk += [sources[index]]
+        chunk_cost += costs[index]
+    return chunks + [chunk] if chunk else chunks
+
+
+def compute_locally(communication_network, chunks, single_source_dijkstra, num_processes, profile, edges=None, per_source=False, successor_index=None):
+    """Yields the chunks with their packed blocks and stats as the local worker processes complete them"""
+    with SharedHypergraph(communication_network, successor_index) as shared_network:
+        with ProcessPoolExecutor(mp_context=mp.get_context('spawn'), max_workers=num_processes, initializer=_init_worker,
+                                 initargs=(shared_network.descriptor, single_source_dijkstra, profile, edges, per_source)) as executor:
+            futures = {executor.submit(_multi_source_task, chunk): chunk for chunk in chunks}
+            for future in as_completed(futures):
+                chunk = futures.pop(future)  # do not keep the blocks of completed chunks
+                if future.exception():
+                    raise future.exception()
+                yield chunk, *future.result()
+
 
 def run_simulation():
     parser = argparse.ArgumentParser(description='Simulating information diffusion in code review communication networks')
     parser.add_argument('--select', type=str, nargs='+', choices=AVAILABLE_DATA_SETS, help='Load a subset of the available data', default=AVAILABLE_DATA_SETS)
     parser.add_argument('--num_processes', type=int, default=mp.cpu_count(), help='Number of parallel processes (default # of CPUs)')
+    parser.add_argument('--decompression_threads', type=int, default=1, help='Number of threads to decompress multi-stream .bz2/.zst network files (default 1)')
+    parser.add_argument('--chunk_size', type=int, default=64, help='Number of participants per worker task (default 64)')
+    parser.add_argument('--successor_budget', type=int, default=SUCCESSOR_BUDGET >> 20,
+                        help=f'MiB for the successor lists of the hyperedges; larger indices are computed lazily with an LRU cache of this size per process (default {SUCCESSOR_BUDGET >> 20})')
+    parser.add_argument('--costs', type=str, choices=COST_ESTIMATES, default='incidences',
+                        help='Estimate the cost of a participant to schedule expensive ones first by its degree, the summed sizes of its channels or data/profiles of a prior --profile run (default incidences)')
+    parser.add_argument('--resume', action='store_true', help='Resume an interrupted run from the columnar results in data/distances and skip the completed participants')
+    parser.add_argument('--update', action='store_true', help='Update the complete results in data/distances with the channels added to the network since; only participants that can reach them are recomputed')
+    parser.add_argument('--min_timing', type=datetime.fromisoformat, help='Only consider channels ending at or after this ISO date(time)')
+    parser.add_argument('--max_timing', type=datetime.fromisoformat, help='Only consider channels ending before this ISO date(time)')
+    parser.add_argument('--profile', action='store_true', help='Record per-participant costs (time, heap operations, relaxations, result size) in data/profiles and print a summary')
+    parser.add_argument('--coordinator', type=str, metavar='HOST:PORT', help='Distribute the participants to workers started by python -m simulation worker instead of local processes, listening on HOST:PORT')
+    parser.add_argument('--authkey', type=str, default=os.environ.get('SIMULATION_AUTHKEY'), help='Shared secret of coordinator and workers (default $SIMULATION_AUTHKEY)')
+    parser.add_argument('--aggregate', action='store_true', help='Only keep per-participant summaries and histograms of the distances in data/aggregates instead of all distances')
+    parser.add_argument('--bins', type=int, default=1000, help='Number of histogram bins of fastest and foremost distances with --aggregate (default 1000)')
+    parser.add_argument('--sample', type=int, help='Estimate reachability and distance distributions from this number of participants sampled by degree, see data/estimates')
+    parser.add_argument('--epsilon', type=float, help='Estimate from a sample large enough that the 95%% confidence interval of the reachable fraction is at most +/- epsilon')
+    parser.add_argument('--strata', type=int, default=10, help='Number of degree strata to sample from with --sample or --epsilon (default 10)')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed of the sample (default 0)')
+    parser.add_argument('--skip_merge', action='store_true', help='Only keep the columnar results in data/distances, do not merge them into .csv.bz2 and .pickle.bz2 files')
+    parser.add_argument('--no_deduplication', action='store_true', help='Search from every participant, also from participants with the same channels as another participant')
+    parser.add_argument('--format', type=str, choices=FORMATS, default='bz2',
+                        help='Merge into .csv.bz2 and .pickle.bz2 files (bz2, default) or an encoded file compressed with zstd (.dist.zst) or raw (.dist)')
 
     group = parser.add_mutually_exclusive_group()
-    group.add_argument('--hyperedge_dijkstra', action='store_false', help='Use single-source Dikstra algorithm via hyperedges; tend to be faster than --vertex_dijkstra (default)')
-    group.add_argument('--vertex_dijkstra', action='store_true', help='Use single-source Dikstra algorithm via vertices')
+    group.add_argument('--hyperedge_dijkstra', action='store_true', help='Use single-source Dikstra algorithm via hyperedges (default)')
+    group.add_argument('--vertex_dijkstra', action='store_true', help='Use single-source Dikstra algorithm via vertices, pruning dominated arrivals per vertex')
+    group.add_argument('--sweep', action='store_true', help='Use time-respecting BFS for shortest and a chronological sweep for foremost distances; fastest distances via hyperedges')
+    group.add_argument('--frontier', action='store_true', help='Use time-respecting BFS vectorized over all participants of a task for shortest and foremost distances; fastest distances via hyperedges')
 
     args = parser.parse_args()
+    sampling = args.sample is not None or args.epsilon is not None
+    if (args.aggregate or sampling) and (args.resume or args.update):
+        parser.error('--aggregate, --sample and --epsilon cannot be combined with --resume or --update')
+    if args.coordinator and not args.authkey:
+        parser.error('--coordinator requires --authkey or $SIMULATION_AUTHKEY')
+    if args.format == 'zstd' and zstandard is None:
+        parser.error('--format zstd requires zstandard')
 
     result_dir_path = Path('./data/minimal_paths/')
     result_dir_path.mkdir(parents=True, exist_ok=True)
 
-    if args.hyperedge_dijkstra:
-        single_source_dijkstra = single_source_dijkstra_hyperedges
-    else:
+    if args.vertex_dijkstra:
         single_source_dijkstra = single_source_dijkstra_vertices
+    elif args.sweep:
+        single_source_dijkstra = single_source_sweep
+    elif args.frontier:
+        single_source_dijkstra = single_source_frontier
+    else:
+        single_source_dijkstra = single_source_dijkstra_hyperedges
+
+    with Coordinator(parse_address(args.coordinator), args.authkey.encode()) if args.coordinator else nullcontext() as coordinator:
+        for name in args.select:
+            communication_network = CompactCommunicationNetwork.from_json(f'./data/networks/{name}.json.bz2', name=name, threads=args.decompression_threads)
+            if args.min_timing or args.max_timing:
+                communication_network = communication_network.window(args.min_timing, args.max_timing)
+            participants = communication_network.vertex_ids()
+            edges = histogram_edges(communication_network, args.bins) if args.aggregate or sampling else None
+            summaries, counts = [], None
+            if args.aggregate or sampling:
+                store = None
+            elif args.update:
+                store_path = Path('./data/distances/')/name
+                store = update(ResultStore(store_path), communication_network, store_path.with_name(f'{name}.update'))
+                os.replace(store_path, store_path.with_name(f'{name}.outdated'))
+                os.replace(store.path, store_path)
+                shutil.rmtree(store_path.with_name(f'{name}.outdated'))
+                store = ResultStore(store_path)
+            elif args.resume:
+                store = ResultStore.resume(Path('./data/distances/')/name, communication_network)
+            else:
+                store = ResultStore.create(Path('./data/distances/')/name, communication_network)
+            completed = store.completed() if store else set()
+            pending = [participant for participant in participants if participant not in completed]
+            if sampling:
+                size = args.sample if args.sample is not None else sample_size(len(participants), args.epsilon)
+                pending, labels, stratum_sizes = stratified_sample(communication_network, size, args.strata, args.seed)
+                counts = []
+            profile_path = Path('./data/profiles/')/f'{name}.csv'
+            profile = pd.read_csv(profile_path) if args.costs == 'profile' and profile_path.exists() else None
+            costs = dict(zip(pending, estimate_costs(communication_network, pending, args.costs, profile).tolist()))
+            total, equivalents = len(pending) + len(completed), {}
+            if store and pending and not args.no_deduplication:
+                representatives, equivalents = equivalent_sources(communication_network, pending)
+                saved = sum(costs[other] for others in equivalents.values() for other in others)
+                print(f'{len(pending) - len(representatives)} of {len(pending)} participants have the same channels as another participant and share its search '
+                      f'({saved / max(sum(costs.values()), 1e-12):.1%} of the estimated cost saved)', file=sys.stderr)
+                pending = representatives
+            chunks = chunk_sources(pending, [costs[source] for source in pending], args.chunk_size, args.num_processes)
+            stats, phases = [], {'compute': time.perf_counter(), 'append': 0.0}
+            if coordinator:
+                results = coordinator.map(network_spec(communication_network, args.min_timing, args.max_timing, single_source_dijkstra, args.profile, edges, sampling, args.successor_budget << 20), chunks)
+            else:
+                # built once here, so that the workers share a materialized index instead of building one each
+                communication_network.successor_budget = args.successor_budget << 20
+                successor_index = communication_network.successor_index(threads=args.num_processes) if single_source_dijkstra in SUCCESSOR_ENGINES else None
+                results = compute_locally(communication_network, chunks, single_source_dijkstra, args.num_processes, args.profile, edges, sampling, successor_index)
+            with tqdm(total=total, initial=len(completed), desc=f'Find all distances at {name.capitalize()}'.ljust(36)) as progress:
+                for chunk, block, task_stats in results:
+                    start = time.perf_counter()
+                    if store:
+                        block, chunk = expand_equivalent(communication_network, block, chunk, equivalents)
+                        store.append(block, chunk)
+                    elif sampling:
+                        summaries += block[0]
+                        counts += [block[1]]
+                    else:
+                        summaries += block[0]
+                        counts = block[1] if counts is None else merge_counts(counts, block[1])
+                    phases['append'] += time.perf_counter() - start
+                    stats += task_stats or []
+                    progress.update(len(chunk))
+            phases['compute'] = time.perf_counter() - phases['compute'] - phases['append']
+            if sampling:
+                write_estimates(communication_network, summaries, stack_counts(counts), edges, pending, labels, stratum_sizes, Path('./data/estimates/'), name)
+            elif args.aggregate:
+                write_aggregates(communication_network, summaries, counts, edges, Path('./data/aggregates/'), name)
+            elif not args.skip_merge:
+                start = time.perf_counter()
+                merge(store, result_dir_path, name, args.format, args.num_processes)
+                phases['merge'] = time.perf_counter() - start
+            if args.profile:
+                write_profile(pd.DataFrame(stats, columns=list(STATS_COLUMNS)).astype(STATS_COLUMNS), phases, Path('./data/profiles/'), name)
+
+
+def write_aggregates(communication_network, summaries, counts, edges, aggregate_dir_path, name):
+    aggregate_dir_path.mkdir(parents=True, exist_ok=True)
+    order = {participant: index for index, participant in enumerate(communication_network.vertex_ids())}
+    summaries = pd.DataFrame(sorted(summaries, key=lambda row: order[row[0]]), columns=SUMMARY_COLUMNS)
+    summaries.to_csv(aggregate_dir_path/f'{name}.csv.bz2', index=False, compression='bz2')
+    (aggregate_dir_path/f'{name}.json').write_bytes(dumps(summarize_distributions(summaries, counts, edges, communication_network.datetime_timings)))
+
+
+def write_estimates(communication_network, summaries, counts, edges, sample, labels, stratum_sizes, estimate_dir_path, name):
+    estimate_dir_path.mkdir(parents=True, exist_ok=True)
+    # align the rows of the completed tasks with the sample and its strata
+    positions = {source: position for position, (source, *_) in enumerate(summaries)}
+    order = np.array([positions[source] for source in sample], dtype=np.int64)
+    summaries = pd.DataFrame([summaries[position] for position in order.tolist()], columns=SUMMARY_COLUMNS).assign(stratum=labels)
+    counts = {distance_type: type_counts[order] for distance_type, type_counts in counts.items()}
+    summaries.to_csv(estimate_dir_path/f'{name}.csv.bz2', index=False, compression='bz2')
+    estimates = estimate(summaries, counts, edges, labels, stratum_sizes, communication_network.num_vertices())
+    (estimate_dir_path/f'{name}.json').write_bytes(dumps({**estimates, 'datetime_timings': communication_network.datetime_timings}))
+    print(dumps({key: value for key, value in estimates.items() if key != 'distance_types'}).decode(), file=sys.stderr)
+
 
-    for name in args.select:
-        communication_network = CommunicationNetwork.from_json(f'./data/networks/{name}.json.bz2', name=name)
-
-        participants = tuple(sorted(communication_network.participants()))
-        category = pd.api.types.CategoricalDtype(categories=participants, ordered=False)
-        data_frames = []
-        for distance_type in DistanceType:
-            distance_type_name = distance_type.name.lower()
-            min_distances = []
-            with ProcessPoolExecutor(mp_context=mp.get_context('spawn'), max_workers=9) as executor:
-                futures = {executor.submit(
-                    single_source_dijkstra, communication_network, p, distance_type): p for p in participants}
-                for future in tqdm(as_completed(futures), total=len(futures), desc=f'Find all {distance_type_name} distances at {name.capitalize()}'.ljust(36)):
-                    source = futures[future]
-                    if future.exception():
-                        raise future.exception()
-                    for target, distance in future.result().items():
-                        min_distances += [(source, target, distance)]
-            min_distances_df = pd.DataFrame(
-                min_distances, columns=['source', 'target', 'distance'])
-            min_distances = None
-            min_distances_df.source = min_distances_df.source.astype(
-                category)
-            min_distances_df.target = min_distances_df.target.astype(
-                category)
-            data_frames += [min_distances_df.set_index(['source', 'target']).distance.rename(distance_type_name).sort_index()]
-        result = pd.concat(data_frames, axis=1).sort_index()
-        result.info(verbose=True, memory_usage=True, show_counts=True)
-        result.to_csv(result_dir_path/f'{name}.csv.bz2', compression='bz2')
-        result.to_pickle(result_dir_path/f'{name}.pickle.bz2', compression='bz2')
+def write_profile(stats: pd.DataFrame, phases: dict, profile_dir_path, name):
+    profile_dir_path.mkdir(parents=True, exist_ok=True)
+    stats.sort_values('seconds', ascending=False).to_csv(profile_dir_path/f'{name}.csv', index=False)
+    summary = dumps(summarize(stats, phases))
+    (profile_dir_path/f'{name}.json').write_bytes(summary)
+    print(summary.decode(), file=sys.stderr)
 
 
 if __name__ == '__main__':
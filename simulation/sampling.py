@@ -0,0 +1,102 @@
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from .aggregates import QUANTILES, histogram_quantiles
+from .minimal_paths import DistanceType
+from .model import CompactTimeVaryingHypergraph
+
+
+def sample_size(num_sources, epsilon, confidence=0.95):
+    """Sample size for which the confidence interval of a fraction has a half-width of at most epsilon (worst case, with finite population correction)"""
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    size = (z / epsilon) ** 2 / 4
+    return min(num_sources, int(np.ceil(size / (1 + (size - 1) / num_sources))))
+
+
+def stratified_sample(hypergraph: CompactTimeVaryingHypergraph, size, strata=10, seed=0):
+    """Random sources stratified by degree and the stratum of each source.
+
+    The vertices are ranked by degree (ties at random) and split into strata of equal size; each stratum contributes
+    sources in proportion to its size, but at least two (for its variance) if it has that many.
+    """
+    rng = np.random.default_rng(seed)
+    degrees = np.diff(hypergraph.arrays()[2])
+    ranked = np.lexsort((rng.random(len(degrees)), degrees))
+    groups = np.array_split(ranked, min(strata, len(degrees)))
+    sample, labels = [], []
+    for stratum, group in enumerate(groups):
+        count = min(len(group), max(2, round(size * len(group) / len(degrees))))
+        sample += rng.choice(group, count, replace=False).tolist()
+        labels += [stratum] * count
+    vertex_ids = hypergraph.vertex_ids()
+    return [vertex_ids[vertex] for vertex in sample], np.array(labels), np.array([len(group) for group in groups])
+
+
+def stratified_ratio(numerators, denominators, labels, stratum_sizes, confidence=0.95):
+    """Estimate and confidence interval of a ratio of population totals from a stratified sample (variance by linearization).
+
+    numerators may have a column per estimated ratio; the denominators are one value per sampled source.
+    """
+    numerators = np.asarray(numerators, dtype=np.float64).reshape(len(labels), -1)
+    denominators = np.asarray(denominators, dtype=np.float64)
+    weights = (stratum_sizes / np.bincount(labels, minlength=len(stratum_sizes)))[labels]
+    total = weights @ denominators
+    if total == 0:
+        return (np.full(numerators.shape[1], np.nan), ) * 3
+    ratio = weights @ numerators / total
+    residuals = (numerators - denominators[:, None] * ratio) / total
+    variance = np.zeros(numerators.shape[1])
+    for stratum, stratum_size in enumerate(stratum_sizes.tolist()):
+        stratum_residuals = residuals[labels == stratum]
+        if len(stratum_residuals) > 1:
+            variance += stratum_size ** 2 * (1 - len(stratum_residuals) / stratum_size) * stratum_residuals.var(axis=0, ddof=1) / len(stratum_residuals)
+    half_width = NormalDist().inv_cdf(0.5 + confidence / 2) * np.sqrt(variance)
+    return ratio, ratio - half_width, ratio + half_width
+
+
+def estimate(summaries: pd.DataFrame, counts, edges, labels, stratum_sizes, num_sources, confidence=0.95):
+    """Estimated reachable fraction and distributions of all sources from the aggregates of a stratified sample (rows aligned with labels).
+
+    The distributions are estimated as cumulative fractions of all pairs at the bin edges; the intervals of the
+    quantiles are read off the intervals of these fractions (Woodruff).
+    """
+    reachable = summaries.reachable.to_numpy(dtype=np.float64)
+    fraction, fraction_low, fraction_high = stratified_ratio(reachable / max(num_sources - 1, 1), np.ones(len(labels)), labels, stratum_sizes, confidence)
+    fraction_low, fraction_high = (np.clip(bound, 0, 1) for bound in (fraction_low, fraction_high))  # within [0, 1] as the CDF bounds
+    result = {'sources': num_sources, 'sample': len(labels), 'confidence': confidence, 'reachable_fraction': _interval(fraction, fraction_low, fraction_high, 0)}
+    result['distance_types'] = {}
+    for distance_type in DistanceType:
+        name = distance_type.name.lower()
+        sums = np.nan_to_num(summaries[f'{name}_mean'].to_numpy(dtype=np.float64)) * reachable
+        cdf, cdf_low, cdf_high = stratified_ratio(np.cumsum(counts[distance_type], axis=1), reachable, labels, stratum_sizes, confidence)
+        # monotone and within [0, 1]; the last fraction is exactly 1
+        cdf_low, cdf_high = (np.clip(np.maximum.accumulate(bound), 0, 1) for bound in (cdf_low, cdf_high))
+        quantiles = [histogram_quantiles(np.diff(bound, prepend=0), edges[distance_type]) for bound in (cdf, cdf_high, cdf_low)]
+        type_edges = np.arange(counts[distance_type].shape[1] + 1) if edges[distance_type] is None else edges[distance_type]
+        result['distance_types'][name] = {
+            'mean': _interval(*stratified_ratio(sums, reachable, labels, stratum_sizes, confidence), 0),
+            'quantiles': {str(quantile): {'estimate': quantiles[0][str(quantile)], 'low': quantiles[1][str(quantile)], 'high': quantiles[2][str(quantile)]}
+                          for quantile in QUANTILES},
+            'edges': type_edges.tolist(),
+            'cdf': cdf.tolist(),
+            'cdf_low': cdf_low.tolist(),
+            'cdf_high': cdf_high.tolist(),
+        }
+    return result
+
+
+def stack_counts(per_source_counts):
+    """Stacks the per-source histograms of several aggregates; histograms per hop are padded to the longest one"""
+    stacked = {}
+    for distance_type in DistanceType:
+        arrays = [counts[distance_type] for counts in per_source_counts]
+        width = max(array.shape[1] for array in arrays)
+        stacked[distance_type] = np.vstack([np.pad(array, ((0, 0), (0, width - array.shape[1]))) for array in arrays])
+    return stacked
+
+
+def _interval(estimate, low, high, column):
+    return {'estimate': float(estimate[column]), 'low': float(low[column]), 'high': float(high[column])}
+
@@ -0,0 +1,49 @@
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .model import CompactTimeVaryingHypergraph, SuccessorIndex, array_layout
+
+_attached = {}
+
+
+class SharedHypergraph:
+    """Publishes the arrays of a compact hypergraph (and of its materialized successor index) in one shared memory block; use as context manager in the parent.
+
+    The attached hypergraphs use the successor index or, without one, build their own with the hypergraph's successor_budget.
+    """
+
+    def __init__(self, hypergraph: CompactTimeVaryingHypergraph, successor_index: SuccessorIndex = None):
+        arrays = hypergraph.arrays() + ((successor_index.arrays() or ()) if successor_index else ())
+        layout, size = array_layout(arrays)
+        self._shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for array, (dtype, offset, length) in zip(arrays, layout):
+            np.ndarray(length, dtype=dtype, buffer=self._shm.buf, offset=offset)[:] = array
+        budget = successor_index.memory_budget if successor_index else hypergraph.successor_budget
+        self.descriptor = (self._shm.name, tuple(layout), hypergraph.hyperedge_ids(), hypergraph.vertex_ids(), hypergraph.datetime_timings, hypergraph.timezone, budget)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        self._shm.close()
+        self._shm.unlink()
+
+
+def attach(descriptor) -> CompactTimeVaryingHypergraph:
+    name, layout, hedge_ids, vertex_ids, datetime_timings, timezone, successor_budget = descriptor
+    shm = shared_memory.SharedMemory(name=name)
+    _attached[name] = shm  # keep the mapping alive as long as the process uses the arrays
+    arrays = []
+    for dtype, offset, length in layout:
+        array = np.ndarray(length, dtype=dtype, buffer=shm.buf, offset=offset)
+        array.flags.writeable = False
+        arrays += [array]
+    hypergraph = CompactTimeVaryingHypergraph(hedge_ids, vertex_ids, *arrays[:5], datetime_timings=datetime_timings, timezone=timezone)
+    hypergraph.successor_budget = successor_budget
+    if len(arrays) > 5:
+        hypergraph.successor_index(arrays=tuple(arrays[5:]))
+    return hypergraph
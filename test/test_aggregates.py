@@ -0,0 +1,50 @@
+import unittest
+
+import numpy as np
+
+from simulation.aggregates import aggregate, histogram_edges, histogram_quantiles, merge_counts
+from simulation.minimal_paths import multi_source_dijkstra_all, DistanceType
+from test.test_minimal_paths import random_hypergraph
+
+
+class AggregatesTest(unittest.TestCase):
+    """Tests reducing packed blocks to summaries per source and mergeable histograms"""
+    compact = random_hypergraph(18).compact()
+
+    def _aggregate(self, sources, edges):
+        codes = np.array([self.compact.vertex_index(source) for source in sources], dtype=np.int32)
+        return aggregate(multi_source_dijkstra_all(self.compact, sources), sources, codes, edges)
+
+    def test_summaries(self):
+        """Tests the summary rows against the distances of each source"""
+        sources = self.compact.vertex_ids()
+        summaries, _ = self._aggregate(sources, histogram_edges(self.compact, 10))
+        for source, row in zip(sources, summaries):
+            _, targets, *distances = multi_source_dijkstra_all(self.compact, [source])
+            self.assertEqual(row[:2], (source, len(targets)))
+            for column, (mean, median, maximum) in zip(distances, zip(row[2::3], row[3::3], row[4::3])):
+                if len(column):
+                    self.assertEqual((mean, median, maximum), (column.mean(), np.median(column), column.max()))
+                else:
+                    self.assertTrue(np.isnan(mean))
+
+    def test_merged_histograms(self):
+        """Tests that merging the histograms of two halves equals the histograms of all sources and covers all pairs"""
+        sources = self.compact.vertex_ids()
+        edges = histogram_edges(self.compact, 7)
+        _, counts = self._aggregate(sources, edges)
+        _, first = self._aggregate(sources[:5], edges)
+        _, second = self._aggregate(sources[5:], edges)
+        merged = merge_counts(first, second)
+        pairs = len(multi_source_dijkstra_all(self.compact, sources)[0])
+        for distance_type in DistanceType:
+            self.assertEqual(merged[distance_type].tolist(), counts[distance_type].tolist())
+            self.assertEqual(counts[distance_type].sum(), pairs)
+
+    def test_histogram_quantiles(self):
+        """Tests quantiles of hops exactly and of fixed bins by interpolation"""
+        shortest = np.array([1, 1, 2, 2, 2, 3, 5])
+        quantiles = histogram_quantiles(np.bincount(shortest), None, (0.5, 0.9))
+        self.assertEqual(quantiles, {'0.5': 2, '0.9': 5})
+        quantiles = histogram_quantiles(np.array([2, 2]), np.array([0, 10, 20]), (0.25, 0.75))
+        self.assertEqual(quantiles, {'0.25': 5.0, '0.75': 15.0})
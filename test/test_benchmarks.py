@@ -0,0 +1,34 @@
+import unittest
+import tempfile
+from pathlib import Path
+
+from benchmarks.generators import synthetic_network, write_network
+from simulation.model import CompactCommunicationNetwork
+from simulation.profiling import source_relaxations
+
+
+class SyntheticNetworkTest(unittest.TestCase):
+    """Tests the synthetic network generator of the benchmarks"""
+
+    def test_reproducible(self):
+        """Tests that the same seed generates the same network and another seed a different one"""
+        self.assertEqual(synthetic_network(50, seed=1), synthetic_network(50, seed=1))
+        self.assertNotEqual(synthetic_network(50, seed=1), synthetic_network(50, seed=2))
+
+    def test_shape(self):
+        """Tests the number of channels, the channel sizes and the heavy-tailed degrees"""
+        channels = synthetic_network(200, channels_per_participant=2, mean_channel_size=4, degree_exponent=1.2, seed=3)
+        self.assertEqual(len(channels), 400)
+        sizes = [len(channel['participants']) for channel in channels.values()]
+        self.assertTrue(all(2 <= size == len(set(channel['participants'])) for size, channel in zip(sizes, channels.values())))
+        self.assertAlmostEqual(sum(sizes) / len(sizes), 4, delta=0.5)
+        degrees = sorted((sum(participant in channel['participants'] for channel in channels.values()) for participant in range(200)), reverse=True)
+        self.assertGreater(degrees[0], 10 * max(degrees[100], 1))
+
+    def test_loadable(self):
+        """Tests that a written network can be loaded and benchmarked"""
+        with tempfile.TemporaryDirectory() as directory:
+            write_network(synthetic_network(30, seed=4), Path(directory)/'network.json.bz2')
+            network = CompactCommunicationNetwork.from_json(Path(directory)/'network.json.bz2', use_cache=False)
+        self.assertEqual(network.num_hyperedges(), 90)
+        self.assertGreater(source_relaxations(network, 0), 0)
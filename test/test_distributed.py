@@ -0,0 +1,71 @@
+import unittest
+import multiprocessing as mp
+import socket
+from multiprocessing.connection import Client
+
+from simulation.distributed import Coordinator, serve
+from simulation.minimal_paths import multi_source_dijkstra_all, single_source_dijkstra_hyperedges
+from test.test_minimal_paths import random_hypergraph
+
+AUTHKEY = b'test'
+
+
+def _load_network(spec):
+    return random_hypergraph(spec['seed']).compact()
+
+
+def _failing_load_network(spec):
+    raise ValueError('Network not found')
+
+
+class DistributedTest(unittest.TestCase):
+    """Tests computing shards of sources in local worker processes connected to a coordinator"""
+
+    def test_workers_compute_all_shards(self):
+        """Tests that shards lost with a worker are retried and all results equal the local computation"""
+        compact = random_hypergraph(17).compact()
+        chunks = [compact.vertex_ids()[start:start + 5] for start in range(0, compact.num_vertices(), 5)]
+        spec = {'name': 'random', 'seed': 17, 'single_source_dijkstra': single_source_dijkstra_hyperedges}
+        with Coordinator(('127.0.0.1', 0), AUTHKEY) as coordinator:
+            lost = Client(coordinator.address, authkey=AUTHKEY)
+            results = coordinator.map(spec, chunks)
+            self.assertEqual(lost.recv()[0], 'task')
+            lost.close()  # a worker that crashes while holding a shard
+            workers = [mp.get_context('spawn').Process(target=serve, args=(coordinator.address, AUTHKEY, _load_network)) for _ in range(2)]
+            for worker in workers:
+                worker.start()
+            completed = {tuple(chunk): block for chunk, block, stats in results}
+        for worker in workers:
+            worker.join(10)
+            self.assertEqual(worker.exitcode, 0)
+        self.assertEqual(sorted(completed), sorted(map(tuple, chunks)))
+        for chunk, block in completed.items():
+            for column, expected in zip(block, multi_source_dijkstra_all(compact, list(chunk))):
+                self.assertEqual(column.tolist(), expected.tolist())
+
+    def test_bare_connections(self):
+        """Tests that clients closing before or during the handshake do not stop the coordinator from accepting workers"""
+        compact = random_hypergraph(18).compact()
+        spec = {'name': 'random', 'seed': 18, 'single_source_dijkstra': single_source_dijkstra_hyperedges}
+        with Coordinator(('127.0.0.1', 0), AUTHKEY) as coordinator:
+            socket.create_connection(coordinator.address).close()
+            with socket.create_connection(coordinator.address) as probe:
+                probe.sendall(b'GET / HTTP/1.0\r\n\r\n')
+            with self.assertRaises(Exception):
+                Client(coordinator.address, authkey=b'wrong')
+            worker = mp.get_context('spawn').Process(target=serve, args=(coordinator.address, AUTHKEY, _load_network, 10.0))
+            worker.start()
+            completed = [chunk for chunk, block, stats in coordinator.map(spec, [compact.vertex_ids()])]
+        worker.join(10)
+        self.assertEqual(worker.exitcode, 0)
+        self.assertEqual(completed, [compact.vertex_ids()])
+
+    def test_failing_shards(self):
+        """Tests that a shard failing more than max_retries times raises with the worker's error"""
+        with Coordinator(('127.0.0.1', 0), AUTHKEY, max_retries=1) as coordinator:
+            worker = mp.get_context('spawn').Process(target=serve, args=(coordinator.address, AUTHKEY, _failing_load_network))
+            worker.start()
+            with self.assertRaisesRegex(RuntimeError, 'Network not found'):
+                list(coordinator.map({'name': 'random', 'seed': 0, 'single_source_dijkstra': single_source_dijkstra_hyperedges}, [[0]]))
+        worker.join(10)
+        self.assertEqual(worker.exitcode, 0)
@@ -0,0 +1,48 @@
+import unittest
+import tempfile
+
+import numpy as np
+
+from simulation.index import DistanceIndex
+from simulation.results import ResultStore
+from simulation.model import EntityNotFound
+from simulation.minimal_paths import multi_source_dijkstra_all, single_source_dijkstra_hyperedges, DistanceType
+from test.test_minimal_paths import random_hypergraph
+
+
+class DistanceIndexTest(unittest.TestCase):
+    """Tests the on-disk distance index"""
+
+    def test_queries_match_single_source_results(self):
+        """Tests that lookups, reachable sets and histograms equal the single-source results"""
+        hypergraph = random_hypergraph(12)
+        compact = hypergraph.compact()
+        sources = compact.vertex_ids()
+        with tempfile.TemporaryDirectory() as directory:
+            store = ResultStore.create(f'{directory}/store', compact)
+            for chunk in (sources[::2], sources[1::2]):
+                store.append(multi_source_dijkstra_all(compact, chunk), chunk)
+            DistanceIndex.build(store, f'{directory}/index')
+            index = DistanceIndex(f'{directory}/index')
+            for source in sources:
+                for distance_type in DistanceType:
+                    expected = single_source_dijkstra_hyperedges(hypergraph, source, distance_type)
+                    self.assertEqual(index.distances(source, distance_type), expected)
+                    for target in sources:
+                        self.assertEqual(index.distance(source, target, distance_type), expected.get(target))
+                self.assertEqual(index.reachable(source), sorted(expected))
+                counts, _ = index.histogram(source, DistanceType.SHORTEST, bins=np.arange(1, 10))
+                hops = list(single_source_dijkstra_hyperedges(hypergraph, source, DistanceType.SHORTEST).values())
+                self.assertEqual(counts.tolist(), [hops.count(hop) for hop in range(1, 9)])
+            with self.assertRaises(EntityNotFound):
+                index.reachable('v99')
+
+    def test_incomplete_store(self):
+        """Tests that an interrupted store is not indexed, as its missing sources would look unreachable"""
+        compact = random_hypergraph(12).compact()
+        sources = compact.vertex_ids()
+        with tempfile.TemporaryDirectory() as directory:
+            store = ResultStore.create(f'{directory}/store', compact)
+            store.append(multi_source_dijkstra_all(compact, sources[:5]), sources[:5])
+            with self.assertRaises(ValueError):
+                DistanceIndex.build(store, f'{directory}/index')
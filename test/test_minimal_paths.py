@@ -1,8 +1,13 @@
 import unittest
+from unittest import mock
 import random
 
+import numpy as np
+from datetime import datetime, timedelta
+
+from simulation import minimal_paths
 from simulation.model import CommunicationNetwork
-from simulation.minimal_paths import single_source_dijkstra_vertices, single_source_dijkstra_hyperedges, DistanceType, TimeVaryingHypergraph
+from simulation.minimal_paths import frontier_shortest_foremost, single_source_frontier, compact_dijkstra_hyperedges, compact_dijkstra_vertices, compact_extend_all, latest_departures, compact_sweep_all, single_source_sweep, single_source_dijkstra_vertices, single_source_dijkstra_hyperedges, multi_source_dijkstra, multi_source_dijkstra_all, compact_dijkstra_hyperedges_all, import_distances, equivalent_sources, expand_equivalent, DistanceType, TimeVaryingHypergraph
 
 class TestVariables(unittest.TestCase):
     cn = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2', 'v3'], 'h3': ['v3', 'v4']}, {'h1': 1, 'h2': 2, 'h3': 3})
@@ -151,7 +156,277 @@ class CompareGraphs(unittest.TestCase):
         self.assertEqual(result_1, result_2, 'Single-source Dijkstra implementations are not equivalent')
 
 
+def random_hypergraph(seed, num_vertices=30, num_hedges=60, max_hedge_size=4, num_timings=20):
+    """Random time-varying hypergraph with datetime timings; few distinct timings to provoke ties"""
+    rng = random.Random(seed)
+    vertices = [f'v{i}' for i in range(num_vertices)]
+    hedges = {f'h{i}': rng.sample(vertices, rng.randint(1, max_hedge_size)) for i in range(num_hedges)}
+    timings = {hedge: datetime(2020, 1, 1) + timedelta(hours=rng.randrange(num_timings)) for hedge in hedges}
+    return TimeVaryingHypergraph(hedges, timings)
+
+
+class CompareCompactGraphs(unittest.TestCase):
+
+    def test_compact_vs_dict_backend(self):
+        """
+        checks if the compact CSR backend gives the same results as the dict backend for all distance types
+        """
+        for seed in range(20):
+            hypergraph = random_hypergraph(seed)
+            compact = hypergraph.compact()
+            for distance_type in DistanceType:
+                for source in sorted(hypergraph.vertices()):
+                    self.assertEqual(single_source_dijkstra_hyperedges(compact, source, distance_type),
+                                     single_source_dijkstra_hyperedges(hypergraph, source, distance_type),
+                                     f'Compact backend differs for {distance_type.name} from {source} (seed {seed})')
+
+    def test_compact_int_timings(self):
+        """
+        checks the compact backend on the known integer-timed network
+        """
+        compact = TestVariables.cn.compact()
+        self.assertEqual(single_source_dijkstra_hyperedges(compact, 'v1', DistanceType.SHORTEST), {'v2': 1, 'v3': 2, 'v4': 3})
+        self.assertEqual(single_source_dijkstra_hyperedges(compact, 'v1', DistanceType.FASTEST), {'v2': 0, 'v3': 1, 'v4': 2})
+        self.assertEqual(single_source_dijkstra_hyperedges(compact, 'v1', DistanceType.FOREMOST), {'v2': 1, 'v3': 2, 'v4': 3})
+
+
+class MultiSourceTest(unittest.TestCase):
+
+    def test_packed_block_matches_single_source(self):
+        """
+        checks if the packed multi-source block contains exactly the single-source results of each source
+        """
+        compact = random_hypergraph(3).compact()
+        sources = compact.vertex_ids()[::3]
+        for distance_type in DistanceType:
+            for single_source_dijkstra in (single_source_dijkstra_hyperedges, single_source_dijkstra_vertices):
+                source_codes, target_codes, distances = multi_source_dijkstra(compact, sources, distance_type, single_source_dijkstra)
+                self.assertEqual(len(source_codes), len(target_codes))
+                self.assertEqual(len(source_codes), len(distances))
+                for source in sources:
+                    expected = import_distances(compact, single_source_dijkstra_hyperedges(compact, source, distance_type), distance_type)
+                    mask = source_codes == compact.vertex_index(source)
+                    self.assertEqual(dict(zip(target_codes[mask].tolist(), distances[mask].tolist())), expected)
 
 
+class AllDistancesTest(unittest.TestCase):
 
+    def test_single_pass_vs_per_metric(self):
+        """
+        checks if the single-pass computation gives the same results as one search per distance type
+        """
+        for seed in range(20):
+            compact = random_hypergraph(seed).compact()
+            for source in range(compact.num_vertices()):
+                all_distances = compact_dijkstra_hyperedges_all(compact, source)
+                for distance_type in DistanceType:
+                    self.assertEqual(all_distances[distance_type], compact_dijkstra_hyperedges(compact, source, distance_type))
+
+    def test_lazy_successors(self):
+        """
+        checks if the searches give the same results when the successor index is too large for its memory budget
+        """
+        for seed in range(5):
+            compact = random_hypergraph(seed).compact()
+            expected = [compact_dijkstra_hyperedges_all(compact, source) for source in range(compact.num_vertices())]
+            lazy = random_hypergraph(seed).compact()
+            lazy.successor_index(memory_budget=1000)
+            self.assertIsNone(lazy.successor_index().arrays())
+            self.assertEqual([compact_dijkstra_hyperedges_all(lazy, source) for source in range(lazy.num_vertices())], expected)
+
+    def test_packed_columns(self):
+        """
+        checks if the packed block holds the per-metric blocks as aligned columns
+        """
+        compact = random_hypergraph(5).compact()
+        sources = compact.vertex_ids()[1::2]
+        source_codes, target_codes, *columns = multi_source_dijkstra_all(compact, sources)
+        vertex_columns = multi_source_dijkstra_all(compact, sources, single_source_dijkstra_vertices)
+        for distance_type, column in zip(DistanceType, columns):
+            expected_sources, expected_targets, expected_distances = multi_source_dijkstra(compact, sources, distance_type)
+            expected = sorted(zip(expected_sources.tolist(), expected_targets.tolist(), expected_distances.tolist()))
+            self.assertEqual(sorted(zip(source_codes.tolist(), target_codes.tolist(), column.tolist())), expected)
+            self.assertEqual(sorted(zip(vertex_columns[0].tolist(), vertex_columns[1].tolist(), vertex_columns[2 + distance_type.value].tolist())), expected)
+
+
+class EquivalentSourcesTest(unittest.TestCase):
+
+    def test_expanded_equals_all_sources(self):
+        """
+        checks if the block of the representatives expanded by their equivalent sources equals the block of all sources
+        """
+        deduplicated = 0
+        for seed in range(20):
+            compact = random_hypergraph(seed, num_hedges=8).compact()
+            sources = list(compact.vertex_ids())
+            representatives, equivalents = equivalent_sources(compact, sources)
+            deduplicated += len(sources) - len(representatives)
+            for representative, others in equivalents.items():
+                self.assertTrue(all(compact.hyperedges(other) == compact.hyperedges(representative) for other in others))
+            for single_source_dijkstra in (single_source_dijkstra_hyperedges, single_source_frontier):
+                expected = multi_source_dijkstra_all(compact, sources, single_source_dijkstra)
+                block, expanded = expand_equivalent(compact, multi_source_dijkstra_all(compact, representatives, single_source_dijkstra), representatives, equivalents)
+                self.assertEqual(sorted(expanded), sorted(sources))
+                self.assertEqual(sorted(zip(*(column.tolist() for column in block))), sorted(zip(*(column.tolist() for column in expected))))
+                self.assertEqual([column.dtype for column in block], [column.dtype for column in expected])
+        self.assertGreater(deduplicated, 0)
+
+
+class CompareSweepGraphs(unittest.TestCase):
+
+    def test_sweep_vs_dijkstra(self):
+        """
+        checks if the BFS and sweep engines give the same results as Dijkstra's algorithm via hyperedges
+        """
+        for seed in range(20):
+            hypergraph = random_hypergraph(seed, num_hedges=90)
+            compact = hypergraph.compact()
+            for distance_type in (DistanceType.SHORTEST, DistanceType.FOREMOST):
+                for source in sorted(hypergraph.vertices()):
+                    self.assertEqual(single_source_sweep(compact, source, distance_type),
+                                     single_source_dijkstra_hyperedges(hypergraph, source, distance_type),
+                                     f'Sweep engine differs for {distance_type.name} from {source} (seed {seed})')
+
+    def test_sweep_known_path(self):
+        """
+        checks the sweep engines on the known network with a tie in timings
+        """
+        compact = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2', 'v3'], 'h3': ['v3', 'v4'], 'h4': ['v1', 'v4']}, {'h1': 1, 'h2': 2, 'h3': 3, 'h4': 3}).compact()
+        self.assertEqual(single_source_sweep(compact, 'v1', DistanceType.SHORTEST), {'v2': 1, 'v3': 2, 'v4': 1})
+        self.assertEqual(single_source_sweep(compact, 'v1', DistanceType.FOREMOST), {'v2': 1, 'v3': 2, 'v4': 3})
+        self.assertEqual(single_source_sweep(compact, 'v2', DistanceType.SHORTEST), {'v1': 1, 'v3': 1, 'v4': 2})
 
+    def test_sweep_all_vs_dijkstra_all(self):
+        """
+        checks if the single-pass sweep gives the same results as the single-pass Dijkstra
+        """
+        for seed in range(10):
+            compact = random_hypergraph(seed).compact()
+            for source in range(compact.num_vertices()):
+                self.assertEqual(compact_sweep_all(compact, source), compact_dijkstra_hyperedges_all(compact, source))
+
+
+class PrunedVertexDijkstraTest(unittest.TestCase):
+
+    def test_pruned_vertices_vs_hyperedges(self):
+        """
+        checks if the pruned Dijkstra via vertices gives the same results as Dijkstra via hyperedges on both backends
+        """
+        for seed in range(20):
+            hypergraph = random_hypergraph(seed, num_hedges=90)
+            compact = hypergraph.compact()
+            for distance_type in DistanceType:
+                for source in sorted(hypergraph.vertices()):
+                    expected = single_source_dijkstra_hyperedges(hypergraph, source, distance_type)
+                    self.assertEqual(single_source_dijkstra_vertices(hypergraph, source, distance_type), expected,
+                                     f'Pruned vertex engine differs for {distance_type.name} from {source} (seed {seed})')
+                    self.assertEqual(single_source_dijkstra_vertices(compact, source, distance_type), expected,
+                                     f'Compact pruned vertex engine differs for {distance_type.name} from {source} (seed {seed})')
+
+    def test_targets(self):
+        """
+        checks if the search with targets returns exactly the distances of the reachable targets
+        """
+        for seed in range(10):
+            hypergraph = random_hypergraph(seed)
+            compact = hypergraph.compact()
+            for distance_type in DistanceType:
+                for source in sorted(hypergraph.vertices())[::5]:
+                    expected = single_source_dijkstra_hyperedges(hypergraph, source, distance_type)
+                    targets = sorted(hypergraph.vertices())[seed::7]
+                    expected = {target: expected[target] for target in targets if target in expected}
+                    self.assertEqual(single_source_dijkstra_vertices(hypergraph, source, distance_type, targets=targets), expected)
+                    self.assertEqual(single_source_dijkstra_vertices(compact, source, distance_type, targets=targets), expected)
+
+    def test_early_termination(self):
+        """
+        checks if the search stops once the target is settled
+        """
+        compact = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v2', 'v3'], 'h3': ['v3', 'v4']}, {'h1': 1, 'h2': 2, 'h3': 3}).compact()
+        self.assertEqual(compact_dijkstra_vertices(compact, 0, DistanceType.SHORTEST, targets={1}), {1: 1})
+        self.assertEqual(compact_dijkstra_vertices(compact, 0, DistanceType.SHORTEST, targets={0}), {})
+
+
+def later_hyperedges(seed, hypergraph, num_hedges=10):
+    """Random hyperedges later than those of random_hypergraph, partly among new vertices"""
+    rng = random.Random(seed)
+    vertices = sorted(hypergraph.vertices()) + [f'w{i}' for i in range(5)]
+    hedges = {f'n{i}': rng.sample(vertices, rng.randint(1, 4)) for i in range(num_hedges)}
+    timings = {hedge: datetime(2020, 1, 2) + timedelta(hours=rng.randrange(5)) for hedge in hedges}
+    return hedges, timings
+
+
+class IncrementalTest(unittest.TestCase):
+
+    def test_extend_vs_recompute(self):
+        """
+        checks if extending the distances on the earlier hyperedges by the later ones equals recomputing them
+        """
+        for seed in range(20):
+            hypergraph = random_hypergraph(seed)
+            compact = hypergraph.compact()
+            extended = compact.append(*later_hyperedges(seed, hypergraph))
+            members, records = latest_departures(extended, compact.num_hyperedges())
+            for source, source_id in enumerate(extended.vertex_ids()):
+                previous = {distance_type: {} for distance_type in DistanceType}
+                if source_id in hypergraph.vertices():
+                    previous = compact_dijkstra_hyperedges_all(compact, compact.vertex_index(source_id))
+                targets = np.array([extended.vertex_index(compact.vertex_ids()[target]) for target in previous[DistanceType.SHORTEST]], dtype=np.int32)
+                columns = [np.array(list(previous[distance_type].values()), dtype=np.int64) for distance_type in DistanceType]
+                targets, *columns = compact_extend_all(extended, source, compact.num_hyperedges(), targets, *columns, (members, records[source]))
+                self.assertEqual({distance_type: dict(zip(targets.tolist(), column.tolist())) for distance_type, column in zip(DistanceType, columns)},
+                                 compact_dijkstra_hyperedges_all(extended, source), f'Extension differs from {source_id} (seed {seed})')
+
+    def test_unaffected_sources(self):
+        """
+        checks if sources that cannot reach the later hyperedges keep their distances
+        """
+        compact = CommunicationNetwork({'h1': ['v1', 'v2'], 'h2': ['v3', 'v4'], 'h3': ['v4', 'v5']}, {'h1': 1, 'h2': 2, 'h3': 3}).compact()
+        members, records = latest_departures(compact, 2)
+        self.assertEqual(members.tolist(), [3, 4])
+        self.assertEqual(records[0], [])
+        self.assertEqual(records[2], [(2, 0b01)])
+        targets = np.array([1], dtype=np.int32)
+        self.assertIs(compact_extend_all(compact, 0, 2, targets, targets, targets, targets, (members, records[0]))[0], targets)
+
+
+class FrontierTest(unittest.TestCase):
+
+    def test_frontier_vs_dijkstra(self):
+        """
+        checks if the vectorized frontier expansion gives the same shortest and foremost distances as Dijkstra's algorithm
+        """
+        for seed in range(20):
+            compact = random_hypergraph(seed, num_hedges=90).compact()
+            sources = list(range(compact.num_vertices()))
+            with mock.patch('simulation.minimal_paths.FRONTIER_BATCH_BYTES', 1000 * (seed % 3) + 1):  # also in batches
+                source_codes, target_codes, shortest, foremost = frontier_shortest_foremost(compact, sources)
+            for source in sources:
+                mask = source_codes == source
+                expected = compact_dijkstra_hyperedges_all(compact, source)
+                self.assertEqual(dict(zip(target_codes[mask].tolist(), shortest[mask].tolist())), expected[DistanceType.SHORTEST])
+                self.assertEqual(dict(zip(target_codes[mask].tolist(), foremost[mask].tolist())), expected[DistanceType.FOREMOST])
+
+    def test_frontier_batch_budget(self):
+        """
+        checks that the dense state of a batch (int32 shortest, int64 foremost, scanned and claim per vertex, int32 visited per hyperedge) fits into FRONTIER_BATCH_BYTES
+        """
+        compact = random_hypergraph(5, num_vertices=10, num_hedges=300).compact()  # the hyperedges dominate
+        source_bytes = 28 * compact.num_vertices() + 4 * compact.num_hyperedges()
+        with mock.patch('simulation.minimal_paths.FRONTIER_BATCH_BYTES', 3 * source_bytes + 1), \
+                mock.patch('simulation.minimal_paths._frontier_batch', wraps=minimal_paths._frontier_batch) as frontier_batch:
+            frontier_shortest_foremost(compact, list(range(compact.num_vertices())))
+        self.assertEqual({len(call.args[1]) for call in frontier_batch.call_args_list}, {3, compact.num_vertices() % 3 or 3})
+
+    def test_frontier_engine(self):
+        """
+        checks the frontier engine in the single-source and the packed multi-source API
+        """
+        compact = random_hypergraph(4).compact()
+        for distance_type in DistanceType:
+            self.assertEqual(single_source_frontier(compact, 'v1', distance_type), single_source_dijkstra_hyperedges(compact, 'v1', distance_type))
+        sources = compact.vertex_ids()[::2]
+        expected = multi_source_dijkstra_all(compact, sources)
+        block = multi_source_dijkstra_all(compact, sources, single_source_frontier)
+        self.assertEqual(sorted(zip(*(column.tolist() for column in block))), sorted(zip(*(column.tolist() for column in expected))))
+        self.assertEqual([column.dtype for column in block], [column.dtype for column in expected])
@@ -1,12 +1,26 @@
 import unittest
 import unittest.mock
-from unittest.mock import MagicMock
 import json
+import bz2
+import tempfile
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
 
 from simulation.model import CommunicationNetwork
 from simulation.model import TimeVaryingHypergraph
 from simulation.model import EntityNotFound
+from simulation.model import CompactCommunicationNetwork
+from simulation.model import iter_json_items
+from simulation.model import iso_microseconds, microseconds, EPOCH, MICROSECOND
+from simulation.model import SuccessorIndex, LRU_ENTRY_BYTES
+from simulation.minimal_paths import single_source_dijkstra_hyperedges, single_source_dijkstra_vertices, DistanceType
+from test.test_minimal_paths import random_hypergraph
 
 
 class ModelTest(unittest.TestCase):
@@ -160,19 +174,204 @@ class TestTimeVaryingHypergraphInputs(unittest.TestCase):
 class TestCommunicationNetwork(unittest.TestCase):
     
     def test_from_json(self):
-        """Mocks the open function, tests that open and read are called"""
-        file_path = "file/path"
-        #tests with orjson, if json change orsjon.loads to json.loads 
-        with unittest.mock.patch('pathlib.Path.open', unittest.mock.mock_open(read_data="fake file")) as mock_file:
-            with unittest.mock.patch('orjson.loads', MagicMock(side_effect= [{"-1000045392462314428":{"bound":"right_bounded","end":"2020-02-05T12:49:39","participants":[-4790071369877151138,-6410414390854871141],"start":"2020-02-04T07:10:58"}}])) as json_mock:
-                CommunicationNetwork.from_json(file_path)
-                
-                #test that open() is called
-                mock_file.assert_called_once()
-                #test that read() is called
-                mock_file().read.assert_called_once()
+        """Tests that the network is loaded through the compact loader (and its cache) and converted with the same content"""
+        raw_data = {'-1000045392462314428': {'bound': 'right_bounded', 'end': '2020-02-05T12:49:39', 'participants': [-4790071369877151138, -6410414390854871141], 'start': '2020-02-04T07:10:58'}}
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = Path(directory)/'network.json.bz2'
+            file_path.write_bytes(bz2.compress(json.dumps(raw_data).encode()))
+            with unittest.mock.patch.object(CompactCommunicationNetwork, 'from_json', wraps=CompactCommunicationNetwork.from_json) as compact_from_json:
+                network = CommunicationNetwork.from_json(file_path, name='test')
+                compact_from_json.assert_called_once()
+            self.assertTrue(Path(f'{file_path}.cache').exists())
+            self.assertEqual(network.name, 'test')
+            self.assertEqual(network.participants('-1000045392462314428'), {-4790071369877151138, -6410414390854871141})
+            self.assertEqual(network.timings('-1000045392462314428'), datetime(2020, 2, 5, 12, 49, 39))
+
+
+class TestCompactTimeVaryingHypergraph(unittest.TestCase):
+    """Tests the integer-indexed CSR backend"""
+    hedges = {'h3': ['v3', 'v4'], 'h1': ['v1', 'v2'], 'h2': ['v2', 'v3', 'v2']}
+    timings = {'h1': datetime(2020, 1, 1), 'h2': datetime(2020, 1, 2, 12), 'h3': datetime(2020, 1, 3)}
+
+    def test_translation_layer(self):
+        """Tests that the compact accessors return the same entities as the original hypergraph"""
+        hypergraph = TimeVaryingHypergraph(self.hedges, self.timings)
+        compact = hypergraph.compact()
+        self.assertEqual(compact.vertices(), hypergraph.vertices())
+        self.assertEqual(compact.hyperedges(), hypergraph.hyperedges())
+        self.assertEqual(compact.timings(), hypergraph.timings())
+        for hedge in hypergraph.hyperedges():
+            self.assertEqual(compact.vertices(hedge), hypergraph.vertices(hedge))
+        for vertex in hypergraph.vertices():
+            self.assertEqual(compact.hyperedges(vertex), hypergraph.hyperedges(vertex))
+
+    def test_chronological_interning(self):
+        """Tests that hyperedges are numbered by time and vertices in sorted order"""
+        compact = TimeVaryingHypergraph(self.hedges, self.timings).compact()
+        self.assertEqual(compact.hyperedge_ids(), ('h1', 'h2', 'h3'))
+        self.assertEqual(compact.vertex_ids(), ('v1', 'v2', 'v3', 'v4'))
+        self.assertEqual(list(compact.incident_vertices(compact.hyperedge_index('h2'))), [1, 2])
+        self.assertEqual(list(compact.incident_hyperedges(compact.vertex_index('v2'))), [0, 1])
+        self.assertEqual(compact.to_duration(compact.timing(1) - compact.timing(0)), timedelta(days=1, hours=12))
+
+    def test_zero_copy_accessors(self):
+        """Tests that the incidence accessors return views into the CSR arrays"""
+        compact = TimeVaryingHypergraph(self.hedges, self.timings).compact()
+        _, hedge_vertices, _, vertex_hedges, _ = compact.arrays()
+        self.assertIs(compact.incident_vertices(0).base, hedge_vertices)
+        self.assertIs(compact.incident_hyperedges(0).base, vertex_hedges)
+
+    def test_unknown_entities(self):
+        """Tests that unknown IDs raise EntityNotFound"""
+        compact = TimeVaryingHypergraph(self.hedges, self.timings).compact()
+        with self.assertRaises(EntityNotFound):
+            compact.hyperedges('v5')
+        with self.assertRaises(EntityNotFound):
+            compact.vertices('h4')
+
+    def test_integer_timings(self):
+        """Tests that the dict backend computes on int timings and returns native timings, also for int timings"""
+        hypergraph = TimeVaryingHypergraph(self.hedges, self.timings)
+        self.assertEqual(hypergraph.timing('h2'), (self.timings['h2'] - EPOCH) // MICROSECOND)
+        self.assertEqual(single_source_dijkstra_hyperedges(hypergraph, 'v2', DistanceType.FASTEST), {'v1': timedelta(0), 'v3': timedelta(0), 'v4': timedelta(hours=12)})
+        numbered = TimeVaryingHypergraph(self.hedges, {hedge: int(timing.timestamp()) for hedge, timing in self.timings.items()})
+        self.assertEqual(numbered.timing('h2'), int(self.timings['h2'].timestamp()))
+        for engine in (single_source_dijkstra_hyperedges, single_source_dijkstra_vertices):
+            self.assertEqual(engine(numbered, 'v2', DistanceType.FASTEST), {'v1': 0, 'v3': 0, 'v4': 12 * 3600})
+            self.assertEqual(engine(numbered, 'v2', DistanceType.FOREMOST), engine(numbered.compact(), 'v2', DistanceType.FOREMOST))
+
+    def test_aware_timings(self):
+        """Tests that timezone-aware timings are computed on in UTC and returned in their timezone"""
+        zone = timezone(timedelta(hours=2))
+        aware = TimeVaryingHypergraph(self.hedges, {hedge: timing.replace(tzinfo=zone) for hedge, timing in self.timings.items()})
+        naive = TimeVaryingHypergraph(self.hedges, {hedge: timing - timedelta(hours=2) for hedge, timing in self.timings.items()})
+        self.assertEqual(aware.timing('h2'), naive.timing('h2'))
+        for engine in (single_source_dijkstra_hyperedges, single_source_dijkstra_vertices):
+            self.assertEqual(engine(aware, 'v2', DistanceType.FASTEST), engine(naive, 'v2', DistanceType.FASTEST))
+            foremost = engine(aware, 'v2', DistanceType.FOREMOST)
+            self.assertEqual(foremost, {vertex: timing.replace(tzinfo=timezone.utc) for vertex, timing in engine(naive, 'v2', DistanceType.FOREMOST).items()})
+            self.assertEqual({timing.tzinfo for timing in foremost.values()}, {zone})
+        self.assertEqual(iso_microseconds(['2020-02-05T12:49:39Z', '2020-02-05T14:49:39+02:00']).tolist(), [microseconds(datetime(2020, 2, 5, 12, 49, 39))] * 2)
+
+    def test_iso_microseconds(self):
+        """Tests that ISO timestamps parsed by NumPy equal those parsed by datetime, also where NumPy cannot parse them"""
+        for timestamps in (['2020-02-05T12:49:39', '2020-02-05 12:49:39.5', '1969-12-31T23:59:59.999999', '2020-02-29'], ['20200205T124939']):
+            self.assertEqual(iso_microseconds(timestamps).tolist(), [(datetime.fromisoformat(timestamp) - EPOCH) // MICROSECOND for timestamp in timestamps])
+
+    def test_successor_index(self):
+        """Tests that the materialized and the lazy successor index equal the later hyperedges of the vertices of each hyperedge"""
+        for seed in range(10):
+            compact = random_hypergraph(seed, num_hedges=60).compact()
+            timings = compact.arrays()[4]
+            expected = [sorted({later for vertex in compact.incident_vertices(hedge) for later in compact.incident_hyperedges(vertex).tolist()
+                                if timings[later] > timings[hedge]}) for hedge in range(compact.num_hyperedges())]
+            materialized = SuccessorIndex(compact)
+            self.assertIsNotNone(materialized.arrays())
+            lazy = SuccessorIndex(compact, memory_budget=LRU_ENTRY_BYTES * 4)
+            self.assertIsNone(lazy.arrays())
+            for hedge in range(compact.num_hyperedges()):
+                self.assertEqual(list(materialized.successors(hedge)), expected[hedge])
+                self.assertEqual(list(lazy.successors(hedge)), expected[hedge])
+                self.assertLessEqual(lazy._cached_bytes, lazy.memory_budget)
+            with unittest.mock.patch('simulation.model.SUCCESSOR_BATCH', 7):  # also in batches on threads
+                self.assertEqual(SuccessorIndex(compact, threads=3).arrays()[1].tolist(), materialized.arrays()[1].tolist())
+
+    def test_window(self):
+        """Tests that both backends restrict to the same hyperedges and their vertices"""
+        hypergraph = TimeVaryingHypergraph(self.hedges, self.timings)
+        for window in (hypergraph.window(datetime(2020, 1, 2), datetime(2020, 1, 3)), hypergraph.compact().window(datetime(2020, 1, 2), datetime(2020, 1, 3))):
+            self.assertEqual(window.hyperedges(), {'h2'})
+            self.assertEqual(window.vertices(), {'v2', 'v3'})
+        self.assertEqual(hypergraph.compact().window(min_timing=datetime(2020, 1, 2)).vertices(), {'v2', 'v3', 'v4'})
+
+    def test_append(self):
+        """Tests that appending later hyperedges to the compact backend equals compacting the appended hypergraph"""
+        hypergraph = TimeVaryingHypergraph(self.hedges, self.timings)
+        hedges = {'h5': ['v0', 'v4'], 'h4': ['v1', 'v5']}
+        timings = {'h4': datetime(2020, 1, 4), 'h5': datetime(2020, 1, 5)}
+        expected = hypergraph.append(hedges, timings).compact()
+        compact = hypergraph.compact().append(hedges, timings)
+        self.assertEqual(compact.hyperedge_ids(), expected.hyperedge_ids())
+        self.assertEqual(compact.vertex_ids(), ('v0', 'v1', 'v2', 'v3', 'v4', 'v5'))
+        for array, expected_array in zip(compact.arrays(), expected.arrays()):
+            self.assertEqual(array.tolist(), expected_array.tolist())
+        self.assertEqual(hypergraph.hyperedges(), {'h1', 'h2', 'h3'})
+        with self.assertRaises(ValueError):
+            compact.append({'h6': ['v1']}, {'h6': datetime(2020, 1, 5)})
+        with self.assertRaises(ValueError):
+            hypergraph.append({'h1': ['v1']}, {'h1': datetime(2020, 1, 6)})
+
+
+class TestNetworkCache(unittest.TestCase):
+    """Tests the binary cache next to the network files"""
+    raw_data = {
+        '1': {'end': '2020-02-05T12:49:39', 'participants': [-4790071369877151138, -6410414390854871141]},
+        '2': {'end': '2020-02-04T07:10:58', 'participants': [-6410414390854871141, 17]},
+        '3': {'end': '2020-02-06T00:00:00', 'participants': [17]},
+    }
+
+    def write_network(self, directory, raw_data):
+        file_path = Path(directory)/'network.json.bz2'
+        file_path.write_bytes(bz2.compress(json.dumps(raw_data).encode()))
+        return file_path
+
+    def test_cache_is_written_and_used(self):
+        """Tests that the second load is served from the memory-mapped cache with the same content"""
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = self.write_network(directory, self.raw_data)
+            parsed = CommunicationNetwork.from_json(file_path, use_cache=False)
+            first = CompactCommunicationNetwork.from_json(file_path, name='test')
+            self.assertTrue(Path(f'{file_path}.cache').exists())
+            cached = CompactCommunicationNetwork.from_json(file_path, name='test')
+            self.assertFalse(cached.arrays()[0].flags.writeable)
+            self.assertEqual(cached.name, 'test')
+            for network in (first, cached, CommunicationNetwork.from_json(file_path)):
+                self.assertEqual(network.participants(), parsed.participants())
+                self.assertEqual(network.timings(), parsed.timings())
+                for channel in parsed.channels():
+                    self.assertEqual(network.participants(channel), parsed.participants(channel))
+
+    def test_stale_cache_is_ignored(self):
+        """Tests that a cache of different file content is not used"""
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = self.write_network(directory, self.raw_data)
+            CompactCommunicationNetwork.from_json(file_path)
+            file_path = self.write_network(directory, {'4': {'end': '2021-01-01T00:00:00', 'participants': [1, 2]}})
+            self.assertEqual(CompactCommunicationNetwork.from_json(file_path).participants(), {1, 2})
+            self.assertEqual(CommunicationNetwork.from_json(file_path).participants(), {1, 2})
+
+
+class TestStreamingIngest(unittest.TestCase):
+    """Tests the incremental JSON parser and the streaming network loader"""
+    raw_data = {str(chan_id): {'end': f'2020-02-{chan_id % 28 + 1:02d}T12:49:39', 'participants': [chan_id % 7, (chan_id * 3) % 11, -1]} for chan_id in range(200)}
+
+    def test_iter_json_items_chunked(self):
+        """Tests that any chunking of the JSON text yields the same key-value pairs"""
+        text = '{ "a" : {"x": [1, 2]}, "b":{"y":"}"} ,"c": 12345 }'
+        for size in (1, 2, 5, len(text)):
+            chunks = [text[i:i + size] for i in range(0, len(text), size)]
+            self.assertEqual(list(iter_json_items(chunks)), list(json.loads(text).items()))
+        self.assertEqual(list(iter_json_items(['{', '}'])), [])
+        with self.assertRaises(ValueError):
+            list(iter_json_items(['{"a": {"x"']))
+
+    def test_streaming_equals_parsed(self):
+        """Tests that the streamed compact network equals the compact form of the parsed network for multi-stream files"""
+        text = json.dumps(self.raw_data).encode()
+        parts = [text[i:i + 1000] for i in range(0, len(text), 1000)]
+        expected = None
+        with tempfile.TemporaryDirectory() as directory:
+            files = {'network.json': text, 'network.json.bz2': b''.join(bz2.compress(part) for part in parts)}
+            if zstandard is not None:
+                files['network.json.zst'] = b''.join(zstandard.ZstdCompressor().compress(part) for part in parts)
+            for file_name, content in files.items():
+                (Path(directory)/file_name).write_bytes(content)
+                if expected is None:
+                    expected = CommunicationNetwork.from_json(Path(directory)/file_name, use_cache=False).compact()
+                for threads in (1, 3):
+                    network = CompactCommunicationNetwork.from_json(Path(directory)/file_name, use_cache=False, threads=threads)
+                    self.assertEqual(network.hyperedge_ids(), expected.hyperedge_ids())
+                    self.assertEqual(network.vertex_ids(), expected.vertex_ids())
+                    for array, expected_array in zip(network.arrays(), expected.arrays()):
+                        self.assertEqual(array.tolist(), expected_array.tolist())
 
-    
-        
-    
-    
@@ -0,0 +1,56 @@
+import unittest
+import heapq
+
+import pandas as pd
+
+from simulation import minimal_paths
+from simulation.profiling import counting_heap, estimate_costs, hyperedge_relaxations, source_relaxations, profile_multi_source_all
+from simulation.minimal_paths import multi_source_dijkstra_all, single_source_dijkstra_hyperedges, single_source_sweep
+from test.test_minimal_paths import random_hypergraph
+
+
+class ProfilingTest(unittest.TestCase):
+    """Tests the opt-in instrumentation of the engines"""
+
+    def test_profiled_block_equals_block(self):
+        """Tests that profiling returns the same packed block and one row of statistics per source"""
+        compact = random_hypergraph(13).compact()
+        sources = compact.vertex_ids()[::3]
+        block, stats = profile_multi_source_all(compact, sources, single_source_dijkstra_hyperedges)
+        for column, expected in zip(block, multi_source_dijkstra_all(compact, sources)):
+            self.assertEqual(column.tolist(), expected.tolist())
+            self.assertEqual(column.dtype, expected.dtype)
+        self.assertEqual([row[0] for row in stats], list(sources))
+        self.assertEqual(sum(row[5] for row in stats), len(block[0]))
+        self.assertTrue(all(row[2] > 0 and row[3] > 0 for row in stats if row[5]))
+        _, sweep_stats = profile_multi_source_all(compact, sources, single_source_sweep)
+        self.assertEqual([row[4] for row in sweep_stats], [row[4] for row in stats])  # relaxations do not depend on the engine
+
+    def test_counting_heap_is_restored(self):
+        """Tests that heap operations are only counted within the context"""
+        with counting_heap() as counter:
+            minimal_paths.compact_dijkstra_hyperedges(random_hypergraph(14).compact(), 0, minimal_paths.DistanceType.SHORTEST)
+        self.assertGreater(counter.pops, 0)
+        self.assertIs(minimal_paths.heapq, heapq)
+
+    def test_hyperedge_relaxations(self):
+        """Tests the relaxations per hyperedge against counting the distinct strictly later hyperedges of its vertices, also without materialized successors"""
+        for memory_budget in (None, 0):
+            compact = random_hypergraph(15).compact()
+            compact.successor_index(memory_budget)
+            relaxations = hyperedge_relaxations(compact)
+            for hedge in range(compact.num_hyperedges()):
+                expected = len({next_hedge for vertex in compact.incident_vertices(hedge) for next_hedge in compact.incident_hyperedges(vertex)
+                                if compact.timing(next_hedge) > compact.timing(hedge)})
+                self.assertEqual(relaxations[hedge], expected)
+            self.assertEqual(source_relaxations(compact, 0, relaxations), sum(relaxations[hedge] for hedge in minimal_paths.bfs_hedge_hops(compact, 0)))
+
+    def test_estimate_costs(self):
+        """Tests the cost estimates by degree, incidences and a prior profile with missing sources"""
+        compact = random_hypergraph(16).compact()
+        sources = compact.vertex_ids()
+        incidences = [sum(len(compact.incident_vertices(hedge)) for hedge in compact.incident_hyperedges(compact.vertex_index(source))) for source in sources]
+        self.assertEqual(estimate_costs(compact, sources, 'degree').tolist(), [len(compact.incident_hyperedges(compact.vertex_index(source))) for source in sources])
+        self.assertEqual(estimate_costs(compact, sources).tolist(), incidences)
+        profile = pd.DataFrame({'source': [str(source) for source in sources[1:]], 'seconds': [2.0 * cost for cost in incidences[1:]]})
+        self.assertEqual(estimate_costs(compact, sources, 'profile', profile).tolist(), [2.0 * cost for cost in incidences])
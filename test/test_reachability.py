@@ -0,0 +1,34 @@
+import unittest
+
+import numpy as np
+
+from simulation.reachability import temporal_reachability, to_bit_matrix
+from simulation.minimal_paths import compact_dijkstra_hyperedges, DistanceType
+from simulation.model import TimeVaryingHypergraph
+from test.test_minimal_paths import random_hypergraph
+
+
+class TemporalReachabilityTest(unittest.TestCase):
+    """Tests the all-sources reachability by reverse chronological bitset propagation"""
+
+    def test_reachability_vs_dijkstra(self):
+        """Tests that the reachable sets equal the targets found by Dijkstra's algorithm"""
+        for seed in range(20):
+            compact = random_hypergraph(seed).compact()
+            reachable = temporal_reachability(compact)
+            for source in range(compact.num_vertices()):
+                targets = compact_dijkstra_hyperedges(compact, source, DistanceType.SHORTEST)
+                self.assertEqual(reachable[source], sum(1 << target for target in targets), f'source {source} (seed {seed})')
+
+    def test_equal_timings_do_not_chain(self):
+        """Tests that hyperedges with equal timings do not reach each other"""
+        compact = TimeVaryingHypergraph({'h1': ['v1', 'v2'], 'h2': ['v2', 'v3']}, {'h1': 1, 'h2': 1}).compact()
+        self.assertEqual(temporal_reachability(compact), [0b010, 0b101, 0b010])
+
+    def test_bit_matrix(self):
+        """Tests that the packed bit matrix unpacks to the reachable sets"""
+        compact = random_hypergraph(1, num_vertices=21).compact()
+        reachable = temporal_reachability(compact)
+        matrix = np.unpackbits(to_bit_matrix(reachable), axis=1, bitorder='little')[:, :compact.num_vertices()]
+        for source, bits in enumerate(reachable):
+            self.assertEqual(np.flatnonzero(matrix[source]).tolist(), [target for target in range(compact.num_vertices()) if bits >> target & 1])
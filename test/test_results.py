@@ -0,0 +1,191 @@
+import unittest
+import bz2
+import json
+import tempfile
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pandas as pd
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from simulation.results import ResultStore, merge, update, write_encoded, read_encoded, read_frame
+from simulation.model import CommunicationNetwork, CompactCommunicationNetwork
+from simulation.index import DistanceIndex
+from simulation.minimal_paths import multi_source_dijkstra_all, single_source_dijkstra_hyperedges, DistanceType
+from test.test_minimal_paths import random_hypergraph, later_hyperedges
+
+
+class ResultStoreTest(unittest.TestCase):
+    """Tests the append-only columnar result store"""
+
+    def test_append_and_read_columns(self):
+        """Tests that appended blocks are read back as one column each"""
+        compact = random_hypergraph(6).compact()
+        sources = compact.vertex_ids()
+        with tempfile.TemporaryDirectory() as directory:
+            store = ResultStore.create(directory, compact)
+            blocks = [multi_source_dijkstra_all(compact, sources[:10]), multi_source_dijkstra_all(compact, sources[10:])]
+            for block, chunk in zip(blocks, (sources[:10], sources[10:])):
+                store.append(block, chunk)
+            reopened = ResultStore(directory)
+            self.assertEqual(reopened.rows(), sum(len(block[0]) for block in blocks))
+            self.assertEqual(reopened.participants, compact.vertex_ids())
+            self.assertEqual(reopened.column('target').tolist(), blocks[0][1].tolist() + blocks[1][1].tolist())
+
+    def test_source_runs(self):
+        """Tests that the runs of rows per source code cover each source's rows, in any order of the sources"""
+        compact = random_hypergraph(6).compact()
+        sources = compact.vertex_ids()
+        with tempfile.TemporaryDirectory() as directory:
+            store = ResultStore.create(directory, compact)
+            self.assertEqual([starts.tolist() for starts in store.source_runs()], [[0] * len(sources)] * 2)
+            store.append(multi_source_dijkstra_all(compact, sources[10:]), sources[10:])
+            store.append(multi_source_dijkstra_all(compact, sources[:10]), sources[:10])
+            column = store.column('source')
+            for code, (start, stop) in enumerate(zip(*store.source_runs())):
+                self.assertEqual(column[start:stop].tolist(), [code] * int((column == code).sum()))
+
+    def test_frame_matches_single_source_results(self):
+        """Tests that the merged frame holds the single-source results with the original types"""
+        hypergraph = random_hypergraph(7)
+        compact = hypergraph.compact()
+        with tempfile.TemporaryDirectory() as directory:
+            store = ResultStore.create(directory, compact)
+            store.append(multi_source_dijkstra_all(compact, compact.vertex_ids()), compact.vertex_ids())
+            result = store.to_frame()
+        for distance_type in DistanceType:
+            expected = pd.Series({(source, target): distance
+                                  for source in compact.vertex_ids()
+                                  for target, distance in single_source_dijkstra_hyperedges(hypergraph, source, distance_type).items()})
+            column = result[distance_type.name.lower()]
+            self.assertEqual(dict(zip(column.index, column.tolist())), expected.to_dict())
+        self.assertTrue(result.index.is_monotonic_increasing)
+
+    def test_resume_drops_uncommitted_writes(self):
+        """Tests that resuming truncates a partially written block and restores the completed sources"""
+        compact = random_hypergraph(8).compact()
+        sources = compact.vertex_ids()
+        with tempfile.TemporaryDirectory() as directory:
+            store = ResultStore.create(directory, compact)
+            block = multi_source_dijkstra_all(compact, sources[:5])
+            store.append(block, sources[:5])
+            with open(f'{directory}/target.bin', 'ab') as file:  # interrupted while appending the next block
+                file.write(b'\x01\x00\x00\x00\x02')
+            resumed = ResultStore.resume(directory, compact)
+            self.assertEqual(resumed.completed(), set(sources[:5]))
+            self.assertEqual(resumed.column('target').tolist(), block[1].tolist())
+            resumed.append(multi_source_dijkstra_all(compact, sources[5:]), sources[5:])
+            self.assertEqual(resumed.completed(), set(sources))
+
+    def test_resume_other_network(self):
+        """Tests that resuming with a different network raises an error"""
+        with tempfile.TemporaryDirectory() as directory:
+            ResultStore.create(directory, random_hypergraph(8).compact())
+            with self.assertRaises(ValueError):
+                ResultStore.resume(directory, random_hypergraph(9, num_vertices=31).compact())
+
+    def test_resume_other_channels(self):
+        """Tests that resuming with other channels of the same participants raises an error"""
+        compact = random_hypergraph(8).compact()
+        changed = random_hypergraph(8).compact()
+        changed._timings = changed._timings + 1
+        with tempfile.TemporaryDirectory() as directory:
+            ResultStore.create(directory, compact)
+            for other in (compact.window(None, compact.to_timing(compact.timing(-1))), changed):
+                with self.assertRaises(ValueError):
+                    ResultStore.resume(directory, other)
+            self.assertEqual(ResultStore.resume(directory, compact).rows(), 0)
+
+    def test_update_equals_recompute(self):
+        """Tests that updating the results with later channels gives the results of the extended network"""
+        hypergraph = random_hypergraph(10)
+        compact = hypergraph.compact()
+        extended = compact.append(*later_hyperedges(10, hypergraph))
+        with tempfile.TemporaryDirectory() as directory:
+            store = ResultStore.create(f'{directory}/old', compact)
+            store.append(multi_source_dijkstra_all(compact, compact.vertex_ids()), compact.vertex_ids())
+            updated = update(store, extended, f'{directory}/new', chunk_size=7)
+            expected = ResultStore.create(f'{directory}/expected', extended)
+            expected.append(multi_source_dijkstra_all(extended, extended.vertex_ids()), extended.vertex_ids())
+            self.assertEqual(updated.completed(), set(extended.vertex_ids()))
+            pd.testing.assert_frame_equal(updated.to_frame(), expected.to_frame())
+            with self.assertRaises(ValueError):
+                update(store, random_hypergraph(11).compact(), f'{directory}/other')
+
+    def test_update_merges_as_recompute(self):
+        """Tests that the merged files of updated results are byte-identical to those of a fresh run"""
+        for seed in (10, 15):
+            hypergraph = random_hypergraph(seed)
+            compact = hypergraph.compact()
+            extended = compact.append(*later_hyperedges(seed, hypergraph))
+            with tempfile.TemporaryDirectory() as directory:
+                store = ResultStore.create(f'{directory}/old', compact)
+                store.append(multi_source_dijkstra_all(compact, compact.vertex_ids()), compact.vertex_ids())
+                merge(update(store, extended, f'{directory}/new'), directory, 'updated')
+                expected = ResultStore.create(f'{directory}/expected', extended)
+                expected.append(multi_source_dijkstra_all(extended, extended.vertex_ids()), extended.vertex_ids())
+                merge(expected, directory, 'expected')
+                for suffix in ('.csv.bz2', '.pickle.bz2'):
+                    self.assertEqual(Path(f'{directory}/updated{suffix}').read_bytes(), Path(f'{directory}/expected{suffix}').read_bytes())
+
+    def test_encoded_round_trip(self):
+        """Tests that raw encoded files read back as the merged frame, also in many small blocks and without results"""
+        self._check_round_trip('raw', ((12, 1 << 22), (13, 50)))
+
+    @unittest.skipUnless(zstandard, 'requires zstandard')
+    def test_encoded_round_trip_zstd(self):
+        """Tests that zstd encoded files read back as the merged frame, also in many small blocks and without results"""
+        self._check_round_trip('zstd', ((12, 1 << 22), (13, 1)))
+
+    def _check_round_trip(self, codec, cases):
+        for seed, block_rows in cases:
+            compact = random_hypergraph(seed).compact()
+            sources = compact.vertex_ids()
+            with tempfile.TemporaryDirectory() as directory:
+                store = ResultStore.create(f'{directory}/store', compact)
+                write_encoded(store, f'{directory}/empty', codec)
+                self.assertEqual(len(read_frame(f'{directory}/empty')), 0)
+                store.append(multi_source_dijkstra_all(compact, sources[10:]), sources[10:])
+                store.append(multi_source_dijkstra_all(compact, sources[:10]), sources[:10])
+                write_encoded(store, f'{directory}/encoded', codec, threads=2, block_rows=block_rows)
+                pd.testing.assert_frame_equal(read_frame(f'{directory}/encoded', threads=2), store.to_frame())
+                participants, _, columns, _ = read_encoded(f'{directory}/encoded')
+                self.assertEqual(participants, compact.vertex_ids())
+                self.assertEqual([column.dtype for column in columns.values()], [store.column(column).dtype for column in columns])
+                with open(f'{directory}/encoded', 'r+b') as file:
+                    file.write(b'X')
+                with self.assertRaises(ValueError):
+                    read_encoded(f'{directory}/encoded')
+
+    def test_aware_timings_end_to_end(self):
+        """Tests that timestamps with an offset are exported in their timezone, as the dict backend computes them, also from the cache"""
+        hypergraph = random_hypergraph(14)
+        zone = timezone(timedelta(hours=2))
+        raw_data = {hedge: {'end': timing.replace(tzinfo=zone).isoformat(), 'participants': sorted(hypergraph.vertices(hedge))}
+                    for hedge, timing in hypergraph.timings().items()}
+        dict_network = CommunicationNetwork({hedge: channel['participants'] for hedge, channel in raw_data.items()},
+                                            {hedge: datetime.fromisoformat(channel['end']) for hedge, channel in raw_data.items()})
+        with tempfile.TemporaryDirectory() as directory:
+            file_path = Path(directory)/'network.json.bz2'
+            file_path.write_bytes(bz2.compress(json.dumps(raw_data).encode()))
+            for _ in range(2):  # parsed, then from the cache
+                compact = CompactCommunicationNetwork.from_json(file_path)
+                self.assertEqual(compact.timezone, zone)
+                store = ResultStore.create(f'{directory}/store', compact)
+                store.append(multi_source_dijkstra_all(compact, compact.vertex_ids()), compact.vertex_ids())
+                result = store.to_frame()
+                expected = pd.DataFrame([(source, target, distance) for source in compact.vertex_ids()
+                                         for target, distance in single_source_dijkstra_hyperedges(dict_network, source, DistanceType.FOREMOST).items()],
+                                        columns=['source', 'target', 'foremost']).set_index(['source', 'target']).foremost.sort_index()
+                self.assertEqual(result.foremost.dtype, expected.dtype)
+                self.assertEqual(result.foremost.to_csv(), expected.to_csv())
+                write_encoded(store, f'{directory}/encoded', 'raw')
+                pd.testing.assert_frame_equal(read_frame(f'{directory}/encoded'), result)
+                index = DistanceIndex.build(store, f'{directory}/index')
+                source = compact.vertex_ids()[0]
+                self.assertEqual(index.distances(source, DistanceType.FOREMOST), single_source_dijkstra_hyperedges(dict_network, source, DistanceType.FOREMOST))
+                self.assertEqual(CommunicationNetwork.from_json(file_path).timings(), dict_network.timings())
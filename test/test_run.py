@@ -0,0 +1,27 @@
+import unittest
+
+from simulation.run import chunk_sources
+from simulation.profiling import estimate_costs
+from test.test_minimal_paths import random_hypergraph
+
+
+class ChunkSourcesTest(unittest.TestCase):
+    """Tests partitioning the participants into worker tasks"""
+    compact = random_hypergraph(4).compact()
+
+    def test_chunks_cover_all_sources(self):
+        """Tests that every source lands in exactly one chunk of at most chunk_size sources"""
+        sources = self.compact.vertex_ids()
+        chunks = chunk_sources(sources, estimate_costs(self.compact, sources), 7, 3)
+        self.assertEqual(sorted(source for chunk in chunks for source in chunk), sorted(sources))
+        self.assertTrue(all(0 < len(chunk) <= 7 for chunk in chunks))
+
+    def test_expensive_sources_first(self):
+        """Tests that chunks are dispatched by descending cost and expensive sources get chunks of their own"""
+        sources = list(range(100))
+        costs = [1000.0 if source < 4 else 1.0 for source in sources]
+        chunks = chunk_sources(sources, costs, 64, 2)
+        self.assertEqual(chunks[:4], [[0], [1], [2], [3]])
+        flat = [source for chunk in chunks for source in chunk]
+        self.assertEqual([costs[source] for source in flat], sorted(costs, reverse=True))
+        self.assertGreater(max(len(chunk) for chunk in chunks), 1)
@@ -0,0 +1,65 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from simulation.aggregates import SUMMARY_COLUMNS, aggregate, histogram_edges
+from simulation.minimal_paths import multi_source_dijkstra_all
+from simulation.sampling import estimate, sample_size, stratified_ratio, stratified_sample
+from test.test_minimal_paths import random_hypergraph
+
+
+class SamplingTest(unittest.TestCase):
+    """Tests estimating reachability and distance distributions from a stratified sample of sources"""
+    compact = random_hypergraph(19).compact()
+
+    def test_sample_size(self):
+        """Tests the sample size of a fraction's confidence interval with and without finite population correction"""
+        self.assertEqual(sample_size(10 ** 9, 0.05), 385)
+        self.assertLess(sample_size(1000, 0.05), 385)
+        self.assertEqual(sample_size(10, 0.01), 10)
+
+    def test_stratified_sample(self):
+        """Tests that the sample is reproducible, has no duplicates and draws from every stratum"""
+        sample, labels, stratum_sizes = stratified_sample(self.compact, 6, strata=3, seed=1)
+        self.assertEqual(stratified_sample(self.compact, 6, strata=3, seed=1)[0], sample)
+        self.assertEqual(len(set(sample)), len(sample))
+        self.assertEqual(set(labels.tolist()), {0, 1, 2})
+        self.assertEqual(stratum_sizes.sum(), self.compact.num_vertices())
+
+    def test_stratified_ratio(self):
+        """Tests that a ratio of a census is exact and intervals cover the ratio"""
+        rng = np.random.default_rng(0)
+        numerators, denominators, labels = rng.random(100), rng.random(100) + 1, np.repeat([0, 1], 50)
+        ratio, low, high = stratified_ratio(numerators, denominators, labels, np.array([50, 50]))
+        self.assertAlmostEqual(ratio[0], numerators.sum() / denominators.sum())
+        self.assertAlmostEqual(low[0], high[0])
+        ratio, low, high = stratified_ratio(numerators[::5], denominators[::5], labels[::5], np.array([50, 50]))
+        self.assertLess(low[0], ratio[0])
+        self.assertGreater(high[0], ratio[0])
+
+    def test_estimate_of_census(self):
+        """Tests that the estimates of a sample of all sources equal the exact values"""
+        sample, labels, stratum_sizes = stratified_sample(self.compact, self.compact.num_vertices(), strata=2)
+        edges = histogram_edges(self.compact, 10)
+        codes = np.array([self.compact.vertex_index(source) for source in sample], dtype=np.int32)
+        block = multi_source_dijkstra_all(self.compact, sample)
+        summaries, counts = aggregate(block, sample, codes, edges, per_source=True)
+        estimates = estimate(pd.DataFrame(summaries, columns=SUMMARY_COLUMNS), counts, edges, labels, stratum_sizes, self.compact.num_vertices())
+        num_vertices = self.compact.num_vertices()
+        self.assertAlmostEqual(estimates['reachable_fraction']['estimate'], len(block[0]) / num_vertices / (num_vertices - 1))
+        self.assertAlmostEqual(estimates['distance_types']['shortest']['mean']['estimate'], block[2].mean())
+        self.assertEqual(estimates['distance_types']['shortest']['quantiles']['0.5']['estimate'], int(np.quantile(block[2], 0.5, method='inverted_cdf')))
+
+    def test_intervals_within_bounds(self):
+        """Tests that the interval of a reachable fraction close to 1 is clipped to [0, 1]"""
+        sample, labels, stratum_sizes = stratified_sample(self.compact, 6, strata=2, seed=1)
+        edges = histogram_edges(self.compact, 10)
+        codes = np.array([self.compact.vertex_index(source) for source in sample], dtype=np.int32)
+        summaries, counts = aggregate(multi_source_dijkstra_all(self.compact, sample), sample, codes, edges, per_source=True)
+        summaries = pd.DataFrame(summaries, columns=SUMMARY_COLUMNS)
+        summaries['reachable'] = [self.compact.num_vertices() - 1] * 5 + [self.compact.num_vertices() // 2]  # all but one reach everybody
+        fraction = estimate(summaries, counts, edges, labels, stratum_sizes, self.compact.num_vertices())['reachable_fraction']
+        self.assertLess(fraction['estimate'], 1)
+        self.assertEqual(fraction['high'], 1)
+        self.assertLess(0, fraction['low'])
@@ -0,0 +1,55 @@
+import unittest
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+from simulation.shared import SharedHypergraph, attach
+from simulation.minimal_paths import single_source_dijkstra_hyperedges, DistanceType
+from test.test_minimal_paths import random_hypergraph
+
+
+def _attached_dijkstra(descriptor, source):
+    return single_source_dijkstra_hyperedges(attach(descriptor), source, DistanceType.FASTEST)
+
+
+class SharedHypergraphTest(unittest.TestCase):
+    """Tests publishing a compact hypergraph via shared memory"""
+
+    def test_attach_arrays(self):
+        """Tests that the attached arrays are equal to the published ones and read-only"""
+        compact = random_hypergraph(1).compact()
+        with SharedHypergraph(compact) as shared:
+            attached = attach(shared.descriptor)
+            for published, array in zip(compact.arrays(), attached.arrays()):
+                self.assertEqual(published.tolist(), array.tolist())
+                self.assertFalse(array.flags.writeable)
+            self.assertEqual(attached.vertex_ids(), compact.vertex_ids())
+            self.assertEqual(attached.timings(), compact.timings())
+
+    def test_attach_successor_index(self):
+        """Tests that a materialized successor index is published with the arrays and otherwise the memory budget"""
+        compact = random_hypergraph(1).compact()
+        with SharedHypergraph(compact, compact.successor_index()) as shared:
+            offsets, successors = attach(shared.descriptor).successor_index().arrays()
+            self.assertEqual(offsets.tolist(), compact.successor_index().arrays()[0].tolist())
+            self.assertEqual(successors.tolist(), compact.successor_index().arrays()[1].tolist())
+            self.assertFalse(successors.flags.writeable)
+        lazy = random_hypergraph(1).compact()
+        with SharedHypergraph(lazy, lazy.successor_index(memory_budget=1000)) as shared:
+            attached = attach(shared.descriptor).successor_index()
+            self.assertIsNone(attached.arrays())
+            self.assertEqual(attached.memory_budget, 1000)
+        unbuilt = random_hypergraph(1).compact()
+        unbuilt.successor_budget = 1000
+        with SharedHypergraph(unbuilt) as shared:
+            attached = attach(shared.descriptor)
+            self.assertEqual(attached.successor_budget, 1000)
+            self.assertIsNone(attached.successor_index().arrays())
+
+    def test_attach_in_spawned_worker(self):
+        """Tests that a spawned worker computes the same distances on the attached hypergraph"""
+        compact = random_hypergraph(2).compact()
+        source = compact.vertex_ids()[0]
+        with SharedHypergraph(compact) as shared:
+            with ProcessPoolExecutor(mp_context=mp.get_context('spawn'), max_workers=1) as executor:
+                result = executor.submit(_attached_dijkstra, shared.descriptor, source).result()
+        self.assertEqual(result, single_source_dijkstra_hyperedges(compact, source, DistanceType.FASTEST))